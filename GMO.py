@@ -1,161 +1,155 @@
-import streamlit as st
-import pandas as pd
-import requests
-from bs4 import BeautifulSoup
-import re
-
-ADDRESS_KEYWORDS = [
-    "所在地", "住所", "本社", "Head Office", "Location", "Map", "company-info", "company-profile", "about-section", "access-info", "location-map", "address", "contact-info"
-]
-
-KEYWORDS = {
-    "営業時間": ["営業時間", "受付時間", "営業日", "open", "business hours"],
-    "郵便番号": ["〒", "郵便番号", "zip", "postal"],
-    "所在地": ADDRESS_KEYWORDS,
-    "定休日": ["定休日", "休業日", "休日", "closed", "休館日"],
-    "アクセス": ["アクセス", "access", "交通", "最寄駅"],
-    "駐車場": ["駐車場", "parking"],
-    "電話番号": ["電話番号", "TEL", "tel.", "電話", "phone"],
-    "電話受付時間": ["電話受付時間", "受付時間", "電話受付", "phone reception"],
-    "FAX": ["FAX", "fax."],
-    "免許番号": ["免許番号", "許可番号", "license", "registration"],
-    "設立（西暦）": ["設立", "創業", "設立年月日", "創立", "established", "founded"]
-}
-
-ADDRESS_PATTERNS = [
-    r"(北海道|青森県|岩手県|宮城県|秋田県|山形県|福島県|茨城県|栃木県|群馬県|埼玉県|千葉県|東京都|神奈川県|新潟県|富山県|石川県|福井県|山梨県|長野県|岐阜県|静岡県|愛知県|三重県|滋賀県|京都府|大阪府|兵庫県|奈良県|和歌山県|鳥取県|島根県|岡山県|広島県|山口県|徳島県|香川県|愛媛県|高知県|福岡県|佐賀県|長崎県|熊本県|大分県|宮崎県|鹿児島県|沖縄県)[^\n]*?(市|区|町|村)[^\n]*?((丁目)?\d{1,4}[-－]?\d{0,4}|\d{1,4}番地?\d{0,4}|[０-９]{1,4}丁目)?[^\n]*?(ビル|号室|F|階|B)?[^\n]*",
-    r"[\u4e00-\u9fa5]{2,10}市[\u4e00-\u9fa5]{1,10}区[^\n]*?((丁目)?\d{1,4}[-－]?\d{0,4}|\d{1,4}番地?\d{0,4})[^\n]*?(ビル|号室|F|階|B)?[^\n]*",
-    r"[\u4e00-\u9fa5]{2,10}区[\u4e00-\u9fa5]{1,10}[^\n]*?((丁目)?\d{1,4}[-－]?\d{0,4}|\d{1,4}番地?\d{0,4})[^\n]*?(ビル|号室|F|階|B)?[^\n]*",
-]
-
-def extract_by_keywords(lines, keywords, value_pattern=None, after_line=0):
-    for i, line in enumerate(lines):
-        if any(k in line for k in keywords):
-            for offset in range(after_line+1):
-                idx = i + offset
-                if idx < len(lines):
-                    target = lines[idx]
-                    if value_pattern:
-                        m = re.search(value_pattern, target)
-                        if m:
-                            return m.group().strip()
-                    else:
-                        val = re.sub('|'.join(keywords), '', target).strip(' :：')
-                        if val:
-                            return val
-    return ""
+import parse_pool
+from address_list import as_rows, blank_row, collect_addresses
+from background_job import render_job, start_job
+from extract_cache import extractor_version, get_cache
+from extractors import (ADDRESS_KEYWORDS, ADDRESS_MATCHER, ADDRESS_PATTERNS, KEYWORDS, ROW_ADDRESS_STRATEGIES,
+                        SPACES_RE, TEXT_ADDRESS_KEYWORDS, Extraction, job_name, registry_version, strip_noise)
+from html_backend import BACKEND, parse_page
+from http_session import ThrottledError, fetch
+from metrics import CACHED, NONE, get_metrics, render_streamlit
+from profile_discovery import PROFILE_LINK_HINTS, follow_profile_links, profile_links
+from stream_parse import ProfileRowScanner
+
+# 出力する列（get_company_info の返す辞書のキー）。所在地だけを計算し、ほかの項目の照合はしない
+FIELDS = ["URL", "所在地"]
+
+# パターンやキーワードを変えるとバージョンが変わり、以前の抽出結果は使われなくなる
+EXTRACTOR_VERSION = extractor_version(ADDRESS_PATTERNS, KEYWORDS, BACKEND, PROFILE_LINK_HINTS)
+# register() で項目が変わったら、それまでの結果も使われなくなる
+EXTRACTION_CACHE = get_cache("GMO", EXTRACTOR_VERSION, extra_version=registry_version)
+# 工程ごとの時間と、住所が取れた方法の件数
+METRICS = get_metrics("GMO")
+# 読み込み中に住所が見つかった行の種類 → 取れた方法の名前
+STREAM_STRATEGIES = {"dt/dd": "dl", "th/td": "head_office_row"}
+
+def page_info(url):
+    """1ページ分の (結果, 会社概要ページの候補URL) を返す"""
+    # ダウンロードしながら dt/dd・th/td の行を読み、住所が取れたらそこで打ち切る
+    scanner = ProfileRowScanner(ADDRESS_MATCHER, clean=strip_noise)
+    with METRICS.phase("fetch"):
+        res = fetch(url, on_chunk=scanner.feed_bytes)
+        scanner.close()
+    if scanner.address:
+        METRICS.set_strategy(STREAM_STRATEGIES[scanner.source])
+        return {"URL": url, "所在地": SPACES_RE.sub(' ', scanner.address)}, ()
+    if getattr(res, "partial", False):
+        # 途中で打ち切ったキャッシュの本文では住所を見落とすので、本文全体を取り直す
+        with METRICS.phase("fetch"):
+            res = fetch(url)
+    # 本文が前回と同じなら抽出をやり直さない
+    result = EXTRACTION_CACHE.get_or_compute(url, res.content, analyze_in_pool)
+    if METRICS.get_strategy() is None:
+        METRICS.set_strategy(CACHED)
+    return result
+
+def analyze_in_pool(url, content):
+    # 解析用のプロセスがあればそちらで解析する（取得したスレッドは結果を待つだけ）
+    return parse_pool.run(analyze_page, url, content, METRICS)
 
 def get_company_info(url):
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8',
-            'Accept-Language': 'ja,en-US;q=0.9,en;q=0.8',
-            'Referer': url,
-            'Connection': 'keep-alive',
-            'Cache-Control': 'max-age=0',
+    with METRICS.track(url):
+        try:
+            info, candidates = page_info(url)
+            if candidates:
+                # 表から住所が取れなかったページ（トップページなど）は、会社概要らしいリンク先を数件だけ見る
+                strategy = METRICS.get_strategy()
+                with METRICS.phase("discovery"):
+                    found = follow_profile_links(candidates, page_info)
+                if found:
+                    info["所在地"] = found["所在地"]
+                    strategy = "profile_link"
+                METRICS.set_strategy(strategy)
+            return info
+        except ThrottledError:
+            # アクセス制限はエラー行にせず、取得エンジンに待ち行列へ戻してもらう
+            raise
+        except Exception as e:
+            METRICS.mark_error()
+            return {"エラー": f"取得できませんでした: {e}"}
+
+def analyze_page(url, content):
+    with METRICS.phase("parse"):
+        page = parse_page(content, text_keywords=TEXT_ADDRESS_KEYWORDS)
+    # dl・表の行から所在地を探し、なければこのページの本文も一応見ておく
+    extraction = Extraction(page, FIELDS[1:], ADDRESS_MATCHER, ROW_ADDRESS_STRATEGIES, METRICS)
+    info = {"URL": url, **extraction.extract()}
+    # dl や表になければ会社概要ページを探す候補を残す
+    candidates = profile_links(page.links, url, ADDRESS_KEYWORDS) if extraction.fell_back else ()
+    return info, candidates
+
+# 住所一覧（ページにあるすべての住所を取り出すモード）の結果は別のキャッシュに置く
+ADDRESS_LIST_CACHE = get_cache("GMO:住所一覧", EXTRACTOR_VERSION)
+
+def analyze_addresses(url, content):
+    with METRICS.phase("parse"):
+        page = parse_page(content, text_keywords=TEXT_ADDRESS_KEYWORDS)
+    with METRICS.phase("address_list"):
+        rows = collect_addresses(page, ADDRESS_MATCHER, clean=strip_noise)
+    METRICS.set_strategy("address_list" if rows else NONE)
+    return tuple({"URL": url, **row} for row in rows)
+
+def addresses_in_pool(url, content):
+    return parse_pool.run(analyze_addresses, url, content, METRICS)
+
+def get_all_addresses(url):
+    """ページにあるすべての住所を1件1行のリストで返す（種別と、都道府県・市区町村などに分けた列つき）"""
+    with METRICS.track(url):
+        try:
+            with METRICS.phase("fetch"):
+                res = fetch(url)
+            rows = list(ADDRESS_LIST_CACHE.get_or_compute(url, res.content, addresses_in_pool))
+            if METRICS.get_strategy() is None:
+                METRICS.set_strategy(CACHED)
+            return rows or [blank_row(url)]
+        except ThrottledError:
+            raise
+        except Exception as e:
+            METRICS.mark_error()
+            return {"エラー": f"取得できませんでした: {e}"}
+
+def main():
+    # Streamlit と pandas は画面を出すときだけ読み込む（CLIやワーカーから import できるように）
+    import pandas as pd
+    import streamlit as st
+    from normalize import dedupe_by_address, normalize_frame
+
+    st.title("会社所在地 自動抽出ツール（複数URL対応・会社概要ページ推奨）")
+    st.markdown(
+        """
+        <style>
+        .block-container, .main, .css-18e3th9, .css-1d391kg {
+            max-width: 100vw !important;
+            width: 100vw !important;
+            padding-left: 2vw !important;
+            padding-right: 2vw !important;
         }
-        res = requests.get(url, headers=headers, timeout=10)
-        soup = BeautifulSoup(res.content, "html.parser")
-    except Exception as e:
-        return {"エラー": f"取得できませんでした: {e}"}
-
-    # 表からのみ所在地を取得
-    address = extract_address_from_table(soup)
-    return {"URL": url, "所在地": address}
-
-def extract_address_from_table(soup):
-    # 1. <dt>所在地</dt> の直後の <dd> を優先
-    for dt in soup.find_all("dt"):
-        if "所在地" in dt.get_text(strip=True):
-            dd = dt.find_next_sibling("dd")
-            if dd:
-                val = dd.get_text(separator=" ", strip=True)
-                for pat in ADDRESS_PATTERNS:
-                    addr_match = re.search(pat, val)
-                    if addr_match:
-                        # 連続した空白（半角・全角）を半角スペース1つにまとめる
-                        address = addr_match.group().strip()
-                        address = re.sub(r'[ \u3000]+', ' ', address)
-                        return address
-    # 2. 既存のテーブル抽出ロジック
-    for table in soup.find_all("table"):
-        for row in table.find_all("tr"):
-            th = row.find("th")
-            td = row.find("td")
-            if th and td:
-                key = th.get_text(strip=True)
-                val = td.get_text(separator=" ", strip=True)
-                val = re.sub(r"\[.*?\]|GoogleMAP|【.*?】", "", val)
-                if any(k in key for k in ["本社", "本店", "本店所在地", "本社所在地"]):
-                    for pat in ADDRESS_PATTERNS:
-                        addr_match = re.search(pat, val)
-                        if addr_match:
-                            # 連続した空白（半角・全角）を半角スペース1つにまとめる
-                            address = addr_match.group().strip()
-                            address = re.sub(r'[ \u3000]+', ' ', address)
-                            return address
-    for table in soup.find_all("table"):
-        for row in table.find_all("tr"):
-            th = row.find("th")
-            td = row.find("td")
-            if th and td:
-                key = th.get_text(strip=True)
-                val = td.get_text(separator=" ", strip=True)
-                val = re.sub(r"\[.*?\]|GoogleMAP|【.*?】", "", val)
-                if any(k in key for k in ["所在地", "住所"]):
-                    for pat in ADDRESS_PATTERNS:
-                        addr_match = re.search(pat, val)
-                        if addr_match:
-                            # 連続した空白（半角・全角）を半角スペース1つにまとめる
-                            address = addr_match.group().strip()
-                            address = re.sub(r'[ \u3000]+', ' ', address)
-                            return address
-    # 3. テーブルやdl以外の「本社住所」「所在地」「住所」キーワードを含むテキストも探索
-    keywords = ["本社住所", "所在地", "住所"]
-    for tag in soup.find_all(text=True):
-        for k in keywords:
-            if k in tag:
-                # 直後のテキストや兄弟要素も連結してみる
-                candidate = tag
-                next_sibling = tag.parent.find_next_sibling()
-                if next_sibling:
-                    candidate += " " + next_sibling.get_text(separator=" ", strip=True)
-                candidate = candidate.replace('\n', ' ').replace('\r', ' ')
-                for pat in ADDRESS_PATTERNS:
-                    addr_match = re.search(pat, candidate)
-                    if addr_match:
-                        # 連続した空白（半角・全角）を半角スペース1つにまとめる
-                        address = addr_match.group().strip()
-                        address = re.sub(r'[ \u3000]+', ' ', address)
-                        return address
-    return ""
-
-st.title("会社所在地 自動抽出ツール（複数URL対応・会社概要ページ推奨）")
-st.markdown(
-    """
-    <style>
-    .block-container, .main, .css-18e3th9, .css-1d391kg {
-        max-width: 100vw !important;
-        width: 100vw !important;
-        padding-left: 2vw !important;
-        padding-right: 2vw !important;
-    }
-    </style>
-    """,
-    unsafe_allow_html=True
-)
-
-urls_text = st.text_area(
-    "会社のWebサイトURLを改行区切りで入力してください（例: https://victory-gp.jp/）",
-    height=200
-)
-
-if urls_text:
-    urls = [u.strip() for u in urls_text.splitlines() if u.strip()]
-    results = []
-    for url in urls:
-        info = get_company_info(url)
-        results.append(info)
-    df = pd.DataFrame(results)
-    st.dataframe(df, use_container_width=True)
+        </style>
+        """,
+        unsafe_allow_html=True
+    )
+
+    urls_text = st.text_area(
+        "会社のWebサイトURLを改行区切りで入力してください（例: https://victory-gp.jp/）",
+        height=200
+    )
+    all_addresses = st.checkbox("ページにあるすべての住所（本社・本店・支店・営業所）を1件1行で出す")
+
+    if urls_text:
+        urls = [u.strip() for u in urls_text.splitlines() if u.strip()]
+        # 抽出はバックグラウンドのスレッドで動かし、終わった行から表に出す
+        # （ジョブはセッションに残るので、操作で再実行されても最初からは始まらない。
+        # 完了した分はチェックポイントにも残るので、再読み込みや中断のあとは続きから処理する）
+        restart = st.button("最初からやり直す")
+        job = start_job(urls, job_name("GMO:住所一覧" if all_addresses else "GMO", EXTRACTOR_VERSION),
+                        get_all_addresses if all_addresses else get_company_info, restart)
+        # 表記ゆれ（全角数字・ハイフン類・空白など）は列ごとにまとめて揃える
+        dedupe = st.checkbox("同じ所在地の行をまとめる")
+
+        def build_frame(results):
+            return normalize_frame(pd.DataFrame([row for result in results for row in as_rows(result)]))
+
+        render_job(job, build_frame, dedupe_by_address if dedupe else None)
+        render_streamlit(METRICS)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+1ページにあるすべての住所（本社・本店・支店・営業所）の取り出し
+
+ページは1回だけ解析し、本文を住所パターンごとに1回ずつ走査して全部の住所を集める。
+それぞれの住所には、同じ行の前の文字列か直前の th/dt の見出し（「本社所在地」「福岡支店」など）
+から種別を付け、郵便番号・都道府県・市区町村・それ以降に分けた行にする。
+"""
+
+import re
+
+from gazetteer import GAZETTEER
+
+# 種別の名前（見出しに含まれていればその種別にする。前にあるものを優先）
+LABELS = ("本社", "本店", "支店", "営業所")
+# 住所一覧の列
+FIELDS = ["URL", "種別", "名称", "郵便番号", "都道府県", "市区町村", "番地以降", "所在地"]
+# 見出しを探しに遡る行数と、見出しとみなす文字列の長さの上限
+LOOKBACK_LINES = 2
+MAX_NAME_LENGTH = 20
+
+ZIP_RE = re.compile(r"〒?\s*(\d{3})[-－ー]?(\d{4})")
+ZIP_LINE_RE = re.compile(r"^〒?\s*\d{3}[-－ー]?\d{4}$")
+SPACES_RE = re.compile(r"\s+")
+NAME_STRIP = " :：　|｜/／-・"
+# 1行に続けて書かれた住所の区切りとみなす文字と、種別の前の名前（「大阪支店」の「大阪」）の長さの上限
+SEPARATORS = " 　|｜/／、,・"
+MAX_BRANCH_PREFIX = 8
+LABEL_RE = re.compile("|".join(LABELS))
+# th/dt 以外（見出しタグや段落）でも見出しとみなす語
+HEADING_RE = re.compile("|".join(LABELS + ("所在地", "住所")))
+
+
+def _zip_code(text):
+    m = ZIP_RE.search(text)
+    return f"{m.group(1)}-{m.group(2)}" if m else ""
+
+
+def _name(text):
+    # 郵便番号と区切り記号を除いた見出し（長すぎるものは本文とみなして使わない）
+    name = ZIP_RE.sub("", text).strip(NAME_STRIP)
+    return name if len(name) <= MAX_NAME_LENGTH else ""
+
+
+def _context(lines, index, prefix, keys):
+    """住所の (見出し, 郵便番号)。同じ行の前の文字列になければ、直前の見出しの行を見る"""
+    name = _name(prefix)
+    zip_code = _zip_code(prefix)
+    j = index - 1
+    for _ in range(LOOKBACK_LINES):
+        if name or j < 0:
+            break
+        line = lines[j].strip()
+        j -= 1
+        if ZIP_LINE_RE.match(line):
+            # 「所在地 / 〒123-4567 / 住所」のように見出しとの間に郵便番号の行があるもの
+            zip_code = zip_code or _zip_code(line)
+            continue
+        if line in keys or (len(line) <= MAX_NAME_LENGTH and HEADING_RE.search(line)):
+            name = _name(line)
+        break
+    return name, zip_code
+
+
+def _split_labeled(address, matcher):
+    """「本社 東京都… 大阪支店 大阪府…」のように1行に続けて書かれた住所を (前置き, 住所) に分ける"""
+    parts = []
+    prefix = ""
+    while True:
+        cut = None
+        for m in LABEL_RE.finditer(address, 1):
+            if not matcher.search(address[m.start():]):
+                continue
+            # 「大阪支店」の「大阪」のような種別の前の名前も次の住所の側に含める
+            cut = m.start()
+            while cut > 0 and m.start() - cut < MAX_BRANCH_PREFIX and address[cut - 1] not in SEPARATORS:
+                cut -= 1
+            if cut > 0:
+                break
+            # 住所の先頭から区切りなしに続く種別（「東京都新宿区本社」など）では分けない
+            # （分けるたびに住所が短くならないと、同じ住所を分け続けて終わらない）
+            cut = None
+        if cut is None:
+            parts.append((prefix, address))
+            return parts
+        parts.append((prefix, address[:cut]))
+        tail = address[cut:]
+        rest = matcher.search(tail)
+        prefix, address = tail[:rest.start()], rest.group()
+
+
+def address_row(address, name="", zip_code=""):
+    """住所1件分の行（URL は呼び出し側で入れる）"""
+    label = LABEL_RE.search(name)
+    pref, city, rest = GAZETTEER.split(address)
+    return {
+        "種別": label.group() if label else "",
+        "名称": name,
+        "郵便番号": zip_code,
+        "都道府県": pref,
+        "市区町村": city,
+        "番地以降": rest,
+        "所在地": address,
+    }
+
+
+def blank_row(url):
+    """住所が1件も取れなかったページの行"""
+    row = dict.fromkeys(FIELDS, "")
+    row["URL"] = url
+    return row
+
+
+def collect_addresses(page, matcher, clean=None):
+    """ページ（PageIndex）にある住所を文書順に行のリストで返す（同じ住所は最初の1件だけ）
+
+    clean(住所) は地図リンクの文字などを取り除く関数。
+    """
+    text = page.text
+    lines = text.split("\n")
+    keys = {key.strip() for key, _ in page.dl_rows}
+    keys.update(key.strip() for key, _ in page.table_rows)
+    starts = [0]
+    for line in lines[:-1]:
+        starts.append(starts[-1] + len(line) + 1)
+
+    rows = []
+    seen = set()
+    index = 0
+    for m in matcher.finditer(text):
+        while index + 1 < len(starts) and starts[index + 1] <= m.start():
+            index += 1
+        prefix = text[starts[index]:m.start()]
+        for part_prefix, address in _split_labeled(m.group(), matcher):
+            if clean is not None:
+                address = clean(address)
+            address = SPACES_RE.sub(" ", address).strip(SEPARATORS)
+            key = address.replace(" ", "")
+            if not address or key in seen:
+                continue
+            seen.add(key)
+            if part_prefix:
+                name, zip_code = _name(part_prefix), _zip_code(part_prefix)
+            else:
+                name, zip_code = _context(lines, index, prefix, keys)
+            rows.append(address_row(address, name, zip_code))
+    return rows
+
+
+def as_rows(result):
+    """抽出結果（住所一覧のリスト、またはエラー行の辞書）を行のリストにする"""
+    return result if isinstance(result, list) else [result]
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+住所パターンの一括照合（事前コンパイル・前段フィルタ付き）
+
+パターンの先頭に gazetteer の地名の選択肢（ANCHORS にある PREFECTURES_RE など）を置くと、
+その語の出現位置だけを照合の起点にし、語の1文字目がない本文はパターンごと飛ばす。
+
+ほかに「数字を含む」「市・区・町・村のどれかを含む」のような前段フィルタの条件を、
+パターンを re の内部の構文解析器（re._parser、Python 3.10 以前は sre_parse）で読んで作る。
+CPython 3.8〜3.13 で確かめている。内部の形が変わって読めない部分は条件にしないだけなので
+（解析に失敗したら条件なし）、別の版でも照合の結果は変わらず、前段で飛ばせる本文が減るだけ。
+"""
+
+import re
+
+from gazetteer import ANCHORS, Trie
+
+try:
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:  # Python 3.10 以前
+    try:
+        import sre_parse
+        import sre_constants
+    except ImportError:
+        sre_parse = sre_constants = None
+
+# \d を要求する条件を表す印
+DIGIT = "DIGIT"
+_DIGIT_RE = re.compile(r"\d")
+# 文字集合としてそのまま展開する範囲の上限（漢字全体のような範囲は条件にしない）
+_MAX_RANGE = 64
+
+
+def _class_requirement(items):
+    """[...] が要求する文字集合（判定できなければ None）"""
+    chars = set()
+    digit = False
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            chars.add(chr(av))
+        elif op is sre_constants.RANGE and av[1] - av[0] < _MAX_RANGE:
+            chars.update(chr(c) for c in range(av[0], av[1] + 1))
+        elif op is sre_constants.CATEGORY and av is sre_constants.CATEGORY_DIGIT:
+            digit = True
+        else:
+            return None
+    if digit:
+        return DIGIT if not chars else None
+    return frozenset(chars)
+
+
+def _requirements(items):
+    """パターンがマッチするために文字列中に必ず現れる文字（集合）の一覧"""
+    reqs = []
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            reqs.append(frozenset(chr(av)))
+        elif op is sre_constants.IN:
+            req = _class_requirement(av)
+            if req is not None:
+                reqs.append(req)
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+            if av[0] >= 1:
+                reqs.extend(_requirements(av[2]))
+        elif op is sre_constants.SUBPATTERN:
+            reqs.extend(_requirements(av[-1]))
+        elif op is sre_constants.BRANCH:
+            alts = [_requirements(alt) for alt in av[1]]
+            # すべての選択肢に共通する条件
+            common = set(alts[0]).intersection(*alts[1:])
+            reqs.extend(common)
+            # 各選択肢の先頭条件のどれか（例: 都道府県名の頭文字のどれか）
+            heads = [alt[0] for alt in alts if alt]
+            if len(heads) == len(alts) and DIGIT not in heads:
+                reqs.append(frozenset().union(*heads))
+    return reqs
+
+
+def _parsed_requirements(pattern):
+    # re の内部の形が変わって解析できなければ条件なし（前段フィルタで飛ばさないだけ）
+    try:
+        return _requirements(list(sre_parse.parse(pattern)))
+    except Exception:
+        return []
+
+
+def _leading_words(pattern):
+    """パターンの先頭に置いた地名の選択肢（gazetteer.ANCHORS のどれか）の語の一覧（なければ None）"""
+    for prefix, words in ANCHORS.items():
+        if pattern.startswith(prefix):
+            return words
+    return None
+
+
+class _CompiledPattern:
+    def __init__(self, pattern, validate=None):
+        self.regex = re.compile(pattern)
+        self.validate = validate
+        words = _leading_words(pattern)
+        # 先頭の選択肢が出現する位置だけを照合の開始位置にする
+        # （選択肢はトライ木から作った接頭辞をまとめた正規表現にし、出現位置を re に探させる）。
+        # 語の1文字目がどれも含まれない本文は走査しない
+        self.anchor = None
+        self.requirements = _parsed_requirements(pattern)
+        if words:
+            self.anchor = re.compile(Trie((w, True) for w in words).pattern())
+            heads = frozenset(w[0] for w in words)
+            if heads not in self.requirements:
+                self.requirements.append(heads)
+
+    def may_match(self, text):
+        for req in self.requirements:
+            if req is DIGIT:
+                if not _DIGIT_RE.search(text):
+                    return False
+            elif not any(c in text for c in req):
+                return False
+        return True
+
+    def search(self, text, endpos=None, pos=0):
+        if endpos is None:
+            endpos = len(text)
+        while True:
+            if self.anchor is None:
+                m = self.regex.search(text, pos, endpos)
+                if not m:
+                    return None
+            else:
+                a = self.anchor.search(text, pos, endpos)
+                if not a:
+                    return None
+                m = self.regex.match(text, a.start(), endpos)
+                if not m:
+                    # 起点が重なっていても拾えるように1文字ずつ進める
+                    pos = a.start() + 1
+                    continue
+            if self.validate is None or self.validate(m.group()):
+                return m
+            pos = m.start() + 1
+
+    def finditer(self, text):
+        """マッチを前から順にすべて返す（次はマッチの終わりから探す）"""
+        pos = 0
+        while True:
+            m = self.search(text, pos=pos)
+            if not m:
+                return
+            yield m
+            pos = max(m.end(), m.start() + 1)
+
+
+class AddressMatcher:
+    """住所パターン群を一度だけコンパイルし、定義順の優先度で照合する"""
+
+    def __init__(self, patterns, validate=None):
+        """validate(住所の文字列) が偽を返したマッチは捨てて、その先を探す"""
+        self.patterns = list(patterns)
+        self._compiled = [_CompiledPattern(p, validate) for p in self.patterns]
+
+    def search(self, text):
+        """定義順で最初にマッチしたパターンの Match を返す（re.search をパターン順に回すのと同じ結果）"""
+        if not text:
+            return None
+        for pat in self._compiled:
+            if pat.may_match(text):
+                m = pat.search(text)
+                if m:
+                    return m
+        return None
+
+    def finditer(self, text):
+        """住所のマッチを1行につき1つずつ、前の行から順にすべて返す
+
+        本文全体をパターンごとに1回ずつ走査する。パターンはどれも行末までを住所とするので、
+        同じ行で複数のパターンがマッチしたときは先に定義されたパターンのマッチを選ぶ。
+        """
+        if not text:
+            return []
+        best = {}
+        for pat in self._compiled:
+            if not pat.may_match(text):
+                continue
+            for m in pat.finditer(text):
+                # 同じ行なら先に定義されたパターンのマッチを残す
+                best.setdefault(text.rfind("\n", 0, m.start()), m)
+        return [best[line] for line in sorted(best)]
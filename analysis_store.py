@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+サイト分析結果（site_analysis.jsonl / site_analysis.json）の索引付きストア（SQLite）
+
+サイトごとの行と集計値を保存しておき、ビューアーは表示する行だけを読む。
+JSONL（1行1サイトの追記形式）は前回読んだ位置から続きだけを取り込み、集計値もその分だけ足す。
+JSON（配列）は更新されたら作り直す。
+
+例:
+    python analysis_store.py site_analysis.jsonl
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+import zlib
+from collections import Counter
+
+ANALYSIS_JSON = "site_analysis.json"
+ANALYSIS_JSONL = "site_analysis.jsonl"
+JSONL_SUFFIXES = (".jsonl", ".ndjson")
+STORE_PATH = os.environ.get("GMO_ANALYSIS_DB", os.path.join(".gmo_cache", "site_analysis.sqlite3"))
+# 一度にまとめて書き込むサイト数
+BATCH_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sites (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    title TEXT NOT NULL DEFAULT '',
+    error TEXT,
+    n_tables INTEGER NOT NULL DEFAULT 0,
+    n_dl INTEGER NOT NULL DEFAULT 0,
+    n_keywords INTEGER NOT NULL DEFAULT 0,
+    detail BLOB
+);
+CREATE INDEX IF NOT EXISTS sites_ok ON sites (error IS NULL, id);
+CREATE TABLE IF NOT EXISTS site_keywords (
+    category TEXT NOT NULL,
+    site_id INTEGER NOT NULL,
+    PRIMARY KEY (category, site_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS keyword_counts (
+    category TEXT PRIMARY KEY,
+    sites INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS key_counts (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (kind, key)
+);
+CREATE INDEX IF NOT EXISTS key_counts_rank ON key_counts (kind, count DESC);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# 表示には使わず詳細にだけ入れる項目
+DETAIL_FIELDS = ("keywords_found", "text_samples", "tables", "dl_elements")
+
+
+def source_signature(path):
+    """元ファイルの更新日時とサイズ（変わっていたら作り直す）"""
+    st = os.stat(path)
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+
+def jsonl_identity(path):
+    """追記されていくファイルの識別子（置き換えられたら変わる）"""
+    st = os.stat(path)
+    return f"jsonl:{st.st_dev}:{st.st_ino}"
+
+
+def append_sites(path, sites):
+    """分析結果を JSONL に追記する（分析する側から1件ずつ、または数件ずつ呼ぶ）"""
+    with open(path, "a", encoding="utf-8") as f:
+        for site in sites:
+            f.write(json.dumps(site, ensure_ascii=False) + "\n")
+
+
+def _pack(detail):
+    # 取り込みの速さを優先して圧縮は軽めにする
+    return zlib.compress(json.dumps(detail, ensure_ascii=False).encode("utf-8"), 1)
+
+
+def _unpack(blob):
+    return json.loads(zlib.decompress(blob).decode("utf-8")) if blob else {}
+
+
+class AnalysisStore:
+    """サイトごとの分析結果と、キーワード・表の見出しの出現数を保存する"""
+
+    def __init__(self, path=STORE_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        # 元ファイルの取り込みは読み始めから書き終わりまでこのロックを持つ
+        # （画面の再実行が重なっても、同じ行を二重に取り込まないように）
+        self._ingest_lock = threading.Lock()
+        # Streamlit の再実行は別スレッドで動くことがあるので、接続はロックで守って共有する
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def _meta(self, name):
+        row = self._conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, name, value):
+        self._conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (name, str(value)))
+
+    @property
+    def version(self):
+        """中身が変わるたびに変わる値（画面側のキャッシュのキーに使う）"""
+        with self._lock:
+            source = self._meta("source")
+            return None if source is None else f"{source}@{self._meta('offset') or 0}"
+
+    def is_current(self, json_path):
+        with self._lock:
+            return self._meta("source") == source_signature(json_path)
+
+    def _clear(self):
+        for table in ("sites", "site_keywords", "keyword_counts", "key_counts", "meta"):
+            self._conn.execute(f"DELETE FROM {table}")
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._clear()
+
+    def add_sites(self, sites, **meta):
+        """サイトを追加し、集計値にその分を足す（meta は同じトランザクションで meta 表に書く）"""
+        with self._lock, self._conn:
+            return self._add_sites(sites, meta)
+
+    def _add_sites(self, sites, meta):
+        # ロックとトランザクションは呼び出し側で持つ
+        keyword_counts = Counter()
+        key_counts = Counter()
+        rows = []
+        keywords = []
+        site_id = self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM sites").fetchone()[0]
+        for site in sites:
+            site_id += 1
+            error = site.get("error")
+            found = site.get("keywords_found") or {}
+            tables = site.get("tables") or []
+            dls = site.get("dl_elements") or []
+            rows.append((site_id, site.get("url", ""), site.get("title") or "", error,
+                         len(tables), len(dls), len(found),
+                         _pack({name: site.get(name) for name in DETAIL_FIELDS})))
+            if error is not None:
+                continue
+            for category in found:
+                keywords.append((category, site_id))
+                keyword_counts[category] += 1
+            for kind, blocks in (("table", tables), ("dl", dls)):
+                for block in blocks:
+                    for row in block:
+                        key_counts[(kind, row.get("key", ""))] += 1
+        self._conn.executemany("INSERT INTO sites VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        self._conn.executemany("INSERT OR IGNORE INTO site_keywords VALUES (?, ?)", keywords)
+        self._conn.executemany(
+            "INSERT INTO keyword_counts VALUES (?, ?) "
+            "ON CONFLICT (category) DO UPDATE SET sites = sites + excluded.sites",
+            keyword_counts.items())
+        self._conn.executemany(
+            "INSERT INTO key_counts VALUES (?, ?, ?) "
+            "ON CONFLICT (kind, key) DO UPDATE SET count = count + excluded.count",
+            ((kind, key, n) for (kind, key), n in key_counts.items()))
+        for name, value in meta.items():
+            self._set_meta(name, value)
+        return len(rows)
+
+    def build(self, sites, source=""):
+        """サイトの分析結果の並びから作り直す
+
+        消去から書き終わりまでを1つのトランザクションで行うので、読む側が作りかけの中身を見ることはない。
+        """
+        with self._lock, self._conn:
+            self._clear()
+            batch = []
+            for site in sites:
+                batch.append(site)
+                if len(batch) >= BATCH_SIZE:
+                    self._add_sites(batch, {})
+                    batch = []
+            self._add_sites(batch, {"source": source})
+
+    def build_from_json(self, json_path):
+        with open(json_path, encoding="utf-8") as f:
+            sites = json.load(f)
+        self.build(sites, source_signature(json_path))
+
+    def ingest_jsonl(self, path):
+        """JSONL の前回の続きから取り込み、追加したサイト数を返す
+
+        書きかけの最後の行は次回に回す。ファイルが置き換えられたり短くなったりしていたら最初から読み直す。
+        読み込むのは BATCH_SIZE 行ずつなので、ファイルが大きくてもメモリは増えない。
+        """
+        with self._ingest_lock:
+            return self._ingest_jsonl(path)
+
+    def _ingest_jsonl(self, path):
+        identity = jsonl_identity(path)
+        with self._lock:
+            source = self._meta("source")
+            offset = int(self._meta("offset") or 0)
+        if source != identity or os.path.getsize(path) < offset:
+            self.clear()
+            offset = 0
+        added = 0
+        batch = []
+        with open(path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                line = line.strip()
+                if line:
+                    try:
+                        batch.append(json.loads(line))
+                    except ValueError:
+                        # 壊れた行は飛ばす（位置は進める）
+                        pass
+                if len(batch) >= BATCH_SIZE:
+                    added += self.add_sites(batch, source=identity, offset=offset)
+                    batch = []
+        added += self.add_sites(batch, source=identity, offset=offset)
+        return added
+
+    def refresh(self, path):
+        """元ファイルの更新分を取り込み、追加したサイト数を返す（JSON は変わっていれば作り直す）"""
+        if path.endswith(JSONL_SUFFIXES):
+            return self.ingest_jsonl(path)
+        with self._ingest_lock:
+            if self.is_current(path):
+                return 0
+            self.build_from_json(path)
+        return self.stats()["total"]
+
+    def stats(self):
+        """{"total", "success", "error"} のサイト数"""
+        with self._lock:
+            total, success = self._conn.execute(
+                "SELECT COUNT(*), COUNT(*) - COUNT(error) FROM sites").fetchone()
+        return {"total": total, "success": success, "error": total - success}
+
+    def keyword_frequency(self):
+        """[(カテゴリ, サイト数)] を多い順に"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT category, sites FROM keyword_counts ORDER BY sites DESC, category").fetchall()
+
+    def categories(self):
+        with self._lock:
+            return [c for (c,) in self._conn.execute("SELECT category FROM keyword_counts ORDER BY category")]
+
+    def key_frequency(self, kind, limit=20):
+        """表（kind="table"）または dl（kind="dl"）の見出しの [(見出し, 出現数)] を多い順に"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT key, count FROM key_counts WHERE kind = ? ORDER BY count DESC, key LIMIT ?",
+                (kind, limit)).fetchall()
+
+    def _where(self, query, category, errors):
+        clauses = ["error IS NOT NULL" if errors else "error IS NULL"]
+        params = []
+        if query:
+            clauses.append("(url LIKE ? OR title LIKE ?)")
+            like = f"%{query}%"
+            params += [like, like]
+        if category:
+            clauses.append("id IN (SELECT site_id FROM site_keywords WHERE category = ?)")
+            params.append(category)
+        return " AND ".join(clauses), params
+
+    def count_sites(self, query="", category=None, errors=False):
+        where, params = self._where(query, category, errors)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM sites WHERE {where}", params).fetchone()[0]
+
+    def sites(self, query="", category=None, errors=False, offset=0, limit=20):
+        """一覧の1ページ分（詳細は含まない）"""
+        where, params = self._where(query, category, errors)
+        with self._lock:
+            cur = self._conn.execute(
+                f"SELECT id, url, title, error, n_tables, n_dl, n_keywords FROM sites WHERE {where} "
+                "ORDER BY id LIMIT ? OFFSET ?", params + [limit, offset])
+            names = [d[0] for d in cur.description]
+            return [dict(zip(names, row)) for row in cur]
+
+    def site_detail(self, site_id):
+        """1サイト分のキーワード・住所サンプル・表・dl"""
+        with self._lock:
+            row = self._conn.execute("SELECT detail FROM sites WHERE id = ?", (site_id,)).fetchone()
+        return _unpack(row[0]) if row else {}
+
+    def close(self):
+        self._conn.close()
+
+
+def default_source():
+    """JSONL があればそちらを、なければ JSON を読む"""
+    return ANALYSIS_JSONL if os.path.exists(ANALYSIS_JSONL) else ANALYSIS_JSON
+
+
+def open_store(source=None, path=STORE_PATH):
+    """ストアを開いて元ファイルの更新分を取り込む（どちらもなければ FileNotFoundError）"""
+    source = source or default_source()
+    store = AnalysisStore(path)
+    if os.path.exists(source):
+        store.refresh(source)
+    elif store.version is None:
+        store.close()
+        raise FileNotFoundError(source)
+    return store
+
+
+def main(argv=None):
+    args = sys.argv[1:] if argv is None else argv
+    source = args[0] if args else default_source()
+    store = AnalysisStore(args[1] if len(args) > 1 else STORE_PATH)
+    store.refresh(source)
+    stats = store.stats()
+    print(f"{store.path}: {stats['total']}サイト（成功 {stats['success']} / エラー {stats['error']}）")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,139 +5,170 @@
 """
 
 import streamlit as st
-import json
 import pandas as pd
 from pathlib import Path
 
-def load_analysis_data():
-    """分析データを読み込み"""
+from analysis_store import JSONL_SUFFIXES, default_source, open_store
+
+# サイト詳細の1ページあたりの件数の選択肢と、エラーサイトの表示件数
+PAGE_SIZES = [10, 20, 50, 100]
+ERROR_LIMIT = 200
+# 自動更新のときに読み込み直す間隔（秒）
+FOLLOW_INTERVAL = 5
+
+@st.cache_resource
+def get_store():
+    """分析データのストアを開く"""
+    return open_store()
+
+def load_store():
     try:
-        with open('site_analysis.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
+        store = get_store()
     except FileNotFoundError:
-        st.error("site_analysis.json ファイルが見つかりません。先に analyze_sites.py を実行してください。")
-        return []
+        st.error("site_analysis.jsonl（または site_analysis.json）ファイルが見つかりません。先に analyze_sites.py を実行してください。")
+        return None
+    # 開いたあとに追記・更新された分を取り込む（JSONL は増えた行だけ読む）
+    source = default_source()
+    if Path(source).exists():
+        store.refresh(source)
+    return store
+
+# 自動更新では追記のたびに version が変わるので、古い版の集計は残さない（表示中の版と1つ前だけ）
+@st.cache_data(max_entries=2)
+def load_summary(_store, version):
+    """基本統計と集計値（ストアの中身が変わらない限り再計算しない）"""
+    return {
+        "stats": _store.stats(),
+        "keywords": _store.keyword_frequency(),
+        "categories": _store.categories(),
+        "table_keys": _store.key_frequency("table"),
+        "dl_keys": _store.key_frequency("dl"),
+    }
+
+def show_site(store, site):
+    detail = store.site_detail(site["id"])
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.write("**基本情報**")
+        st.write(f"タイトル: {site['title']}")
+        st.write(f"テーブル数: {site['n_tables']}")
+        st.write(f"dl要素数: {site['n_dl']}")
+
+        if detail.get('keywords_found'):
+            st.write("**見つかったキーワード**")
+            for category, words in detail['keywords_found'].items():
+                st.write(f"- {category}: {', '.join(words)}")
+
+    with col2:
+        if detail.get('text_samples'):
+            st.write("**住所サンプル**")
+            for sample in detail['text_samples'][:2]:
+                st.write(f"- {sample}")
+
+    # テーブル構造の表示（expander は入れ子にできないので見出し付きで並べる）
+    if detail.get('tables'):
+        st.write("**テーブル構造**")
+        for j, table in enumerate(detail['tables']):
+            st.caption(f"テーブル {j+1}")
+            st.dataframe(pd.DataFrame(table), use_container_width=True)
+
+    # dl構造の表示
+    if detail.get('dl_elements'):
+        st.write("**dl構造**")
+        for j, dl in enumerate(detail['dl_elements']):
+            st.caption(f"dl要素 {j+1}")
+            st.dataframe(pd.DataFrame(dl), use_container_width=True)
+
+def show_stats(store, follow):
+    """基本統計とキーワード出現頻度（自動更新のときはこの部分だけ一定間隔で追記分を読み込んで描き直す）"""
+    if follow:
+        source = default_source()
+        if Path(source).exists():
+            store.refresh(source)
+    summary = load_summary(store, store.version)
+    stats = summary["stats"]
 
-def main():
-    st.title("不動産会社サイト分析結果ビューアー")
-    
-    data = load_analysis_data()
-    if not data:
-        return
-    
     # 基本統計
     st.header("📊 基本統計")
-    total_sites = len(data)
-    successful_sites = len([d for d in data if "error" not in d])
-    error_sites = total_sites - successful_sites
-    
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("総サイト数", total_sites)
+        st.metric("総サイト数", stats["total"])
     with col2:
-        st.metric("成功", successful_sites)
+        st.metric("成功", stats["success"])
     with col3:
-        st.metric("エラー", error_sites)
-    
+        st.metric("エラー", stats["error"])
+
     # キーワード出現頻度
     st.header("🔍 キーワード出現頻度")
-    keyword_stats = {}
-    for result in data:
-        if "error" not in result and "keywords_found" in result:
-            for category in result["keywords_found"]:
-                keyword_stats[category] = keyword_stats.get(category, 0) + 1
-    
-    if keyword_stats:
+    if summary["keywords"] and stats["success"]:
         keyword_df = pd.DataFrame([
-            {"キーワード": k, "出現回数": v, "出現率": f"{v/successful_sites*100:.1f}%"}
-            for k, v in sorted(keyword_stats.items(), key=lambda x: x[1], reverse=True)
+            {"キーワード": k, "出現回数": v, "出現率": f"{v/stats['success']*100:.1f}%"}
+            for k, v in summary["keywords"]
         ])
         st.dataframe(keyword_df, use_container_width=True)
-    
-    # サイト詳細
+
+def main():
+    st.title("不動産会社サイト分析結果ビューアー")
+
+    store = load_store()
+    if store is None:
+        return
+    summary = load_summary(store, store.version)
+    stats = summary["stats"]
+    if not stats["total"]:
+        return
+
+    # クロール中の JSONL は自動で読み込み直せるようにする
+    follow = False
+    if default_source().endswith(JSONL_SUFFIXES):
+        follow = st.toggle(f"自動更新（{FOLLOW_INTERVAL}秒ごとに追記分を読み込む）")
+
+    # 自動更新は統計の部分だけを描き直す（画面全体は止めずに、ほかの操作もそのまま受け付ける。
+    # サイト詳細やパターン分析は次に操作したときに新しい分が反映される）
+    st.fragment(run_every=FOLLOW_INTERVAL if follow else None)(show_stats)(store, follow)
+
+    # サイト詳細（表示するページの分だけ読み込む）
     st.header("🏢 サイト詳細")
-    
-    # 成功したサイトのみ表示
-    successful_data = [d for d in data if "error" not in d]
-    
-    for i, site in enumerate(successful_data):
-        with st.expander(f"{i+1}. {site['title']} ({site['url']})"):
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                st.write("**基本情報**")
-                st.write(f"タイトル: {site['title']}")
-                st.write(f"テーブル数: {len(site['tables'])}")
-                st.write(f"dl要素数: {len(site['dl_elements'])}")
-                
-                if site['keywords_found']:
-                    st.write("**見つかったキーワード**")
-                    for category, words in site['keywords_found'].items():
-                        st.write(f"- {category}: {', '.join(words)}")
-            
-            with col2:
-                if site['text_samples']:
-                    st.write("**住所サンプル**")
-                    for sample in site['text_samples'][:2]:
-                        st.write(f"- {sample}")
-            
-            # テーブル構造の表示
-            if site['tables']:
-                st.write("**テーブル構造**")
-                for j, table in enumerate(site['tables']):
-                    with st.expander(f"テーブル {j+1}"):
-                        table_df = pd.DataFrame(table)
-                        st.dataframe(table_df, use_container_width=True)
-            
-            # dl構造の表示
-            if site['dl_elements']:
-                st.write("**dl構造**")
-                for j, dl in enumerate(site['dl_elements']):
-                    with st.expander(f"dl要素 {j+1}"):
-                        dl_df = pd.DataFrame(dl)
-                        st.dataframe(dl_df, use_container_width=True)
-    
+    col1, col2, col3 = st.columns([3, 2, 1])
+    with col1:
+        query = st.text_input("URL・タイトルで絞り込み")
+    with col2:
+        category = st.selectbox("キーワードで絞り込み", ["（すべて）"] + summary["categories"])
+        category = None if category == "（すべて）" else category
+    with col3:
+        page_size = st.selectbox("表示件数", PAGE_SIZES, index=1)
+
+    matched = store.count_sites(query, category)
+    pages = max(1, -(-matched // page_size))
+    page = st.number_input(f"ページ（全 {pages} ページ・{matched} 件）", min_value=1, max_value=pages, value=1)
+    offset = (page - 1) * page_size
+    for i, site in enumerate(store.sites(query, category, offset=offset, limit=page_size)):
+        with st.expander(f"{offset+i+1}. {site['title']} ({site['url']})"):
+            show_site(store, site)
+
     # エラーサイト
-    if error_sites > 0:
+    if stats["error"] > 0:
         st.header("❌ エラーサイト")
-        error_data = [d for d in data if "error" in d]
-        for site in error_data:
+        for site in store.sites(errors=True, limit=ERROR_LIMIT):
             st.write(f"- {site['url']}: {site['error']}")
-    
+        if stats["error"] > ERROR_LIMIT:
+            st.caption(f"ほか {stats['error'] - ERROR_LIMIT} 件")
+
     # パターン分析
     st.header("🎯 パターン分析")
-    
+
     # テーブル構造のパターン
-    table_patterns = {}
-    for site in successful_data:
-        for table in site['tables']:
-            for row in table:
-                key = row['key']
-                table_patterns[key] = table_patterns.get(key, 0) + 1
-    
-    if table_patterns:
+    if summary["table_keys"]:
         st.write("**テーブルでよく使われるキー**")
-        pattern_df = pd.DataFrame([
-            {"キー": k, "出現回数": v}
-            for k, v in sorted(table_patterns.items(), key=lambda x: x[1], reverse=True)[:20]
-        ])
+        pattern_df = pd.DataFrame([{"キー": k, "出現回数": v} for k, v in summary["table_keys"]])
         st.dataframe(pattern_df, use_container_width=True)
-    
+
     # dl構造のパターン
-    dl_patterns = {}
-    for site in successful_data:
-        for dl in site['dl_elements']:
-            for row in dl:
-                key = row['key']
-                dl_patterns[key] = dl_patterns.get(key, 0) + 1
-    
-    if dl_patterns:
+    if summary["dl_keys"]:
         st.write("**dl要素でよく使われるキー**")
-        dl_pattern_df = pd.DataFrame([
-            {"キー": k, "出現回数": v}
-            for k, v in sorted(dl_patterns.items(), key=lambda x: x[1], reverse=True)[:20]
-        ])
+        dl_pattern_df = pd.DataFrame([{"キー": k, "出現回数": v} for k, v in summary["dl_keys"]])
         st.dataframe(dl_pattern_df, use_container_width=True)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
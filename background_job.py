@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Streamlit の画面から抽出ジョブをバックグラウンドのスレッドで動かす
+
+画面のスクリプトは操作や再読み込みのたびに頭から実行し直されるので、ジョブは
+st.session_state（とプロセス内の一覧）に置き、同じバッチなら動いているスレッドをそのまま使う。
+結果は終わった順に溜め、表と進捗は st.fragment で一定間隔ごとに描き直す。
+
+    restart = st.button("最初からやり直す")
+    job = start_job(urls, "GMO", get_company_info, restart)
+    render_job(job, build_frame)
+"""
+
+import threading
+import time
+
+from job_store import JOB_DB_PATH, JobStore, is_error, run_job
+
+# 実行中に表と進捗を描き直す間隔（秒）
+REFRESH_SECONDS = 1.0
+SESSION_KEY = "gmo_background_job"
+# 表に出す DataFrame の作りかけ（ジョブ, 結果の版, 行にした結果の数, DataFrame）
+FRAME_KEY = "gmo_background_frame"
+
+RUNNING = "running"
+FINISHED = "finished"
+CANCELLED = "cancelled"
+FAILED = "failed"
+
+# 動いているジョブ（ジョブID → BackgroundJob）。ブラウザを再読み込みして
+# セッションが変わっても、同じバッチなら新しいスレッドを立てずにこれにつなぐ
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+class BackgroundJob:
+    """1つのジョブを別スレッドで実行し、終わった結果を溜める"""
+
+    def __init__(self, job_id, func, path=JOB_DB_PATH):
+        self.job_id = job_id
+        self.func = func
+        self.path = path
+        store = JobStore(path)
+        try:
+            counts = store.progress(job_id)
+            # 前回までに終わった分（エラーはやり直すので含めない）
+            results = [r for r in store.results(job_id) if not is_error(r)]
+        finally:
+            store.close()
+        self.total = counts["total"]
+        self.status = RUNNING
+        self.error = None
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._results = results
+        # 結果のリストを並べ直したら増やす（表を作り直す目印）
+        self._generation = 0
+        self._resumed = len(results)
+        self._processed = 0
+        self._started = time.monotonic()
+        self._finished = None
+        self._thread = threading.Thread(target=self._run, name=f"job-{job_id}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        # SQLite の接続はスレッドをまたいで使えないので、このスレッドで開き直す
+        store = JobStore(self.path)
+        try:
+            run_job(store, self.job_id, self.func, on_result=self._on_result, cancel=self._cancel)
+            # 終わったら入力順に並べ直す
+            results = store.results(self.job_id)
+            with self._lock:
+                if not self._cancel.is_set():
+                    self._results = results
+                    self._generation += 1
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            store.close()
+            with self._lock:
+                self._finished = time.monotonic()
+                if self.error is not None:
+                    self.status = FAILED
+                elif self._cancel.is_set():
+                    self.status = CANCELLED
+                else:
+                    self.status = FINISHED
+            with _jobs_lock:
+                if _jobs.get(self.job_id) is self:
+                    del _jobs[self.job_id]
+
+    def _on_result(self, url, result):
+        with self._lock:
+            self._results.append(result)
+            self._processed += 1
+
+    @property
+    def running(self):
+        return self._thread.is_alive()
+
+    @property
+    def cancelling(self):
+        return self._cancel.is_set() and self.running
+
+    def cancel(self):
+        """新しいURLの処理を止める（処理中のURLが終わるとスレッドも終わる）"""
+        self._cancel.set()
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+    def snapshot(self):
+        """(これまでの結果のリスト, 結果の版, 終わった件数, 今回処理した件数, 経過秒数)
+
+        結果の版が同じあいだは、前に返したリストの後ろに結果が足されていくだけ。
+        """
+        with self._lock:
+            end = self._finished if self._finished is not None else time.monotonic()
+            done = self._resumed + self._processed
+            return list(self._results), self._generation, done, self._processed, end - self._started
+
+
+def start_job(urls, extractor, func, restart=False, path=JOB_DB_PATH):
+    """バッチのジョブを返す（セッションか実行中の一覧に同じバッチがあればそれを、なければ新しく動かす）
+
+    restart なら動いているジョブを止め、チェックポイントを消して最初から処理する。
+    """
+    import streamlit as st
+
+    store = JobStore(path)
+    try:
+        job_id = store.create_job(urls, extractor)
+        job = st.session_state.get(SESSION_KEY)
+        if job is not None and job.job_id != job_id:
+            # 入力が変わった（前のバッチの残りはチェックポイントから続きを処理できる）
+            job.cancel()
+            job = None
+        if job is not None and not restart:
+            return job
+        # 一覧を調べてから新しいジョブを登録するまでをひとつのロックの中で行う
+        # （同じバッチを同時に開いたセッションがそれぞれスレッドを立てないように）
+        stop = restart
+        while True:
+            with _jobs_lock:
+                running = _jobs.get(job_id)
+                if running is None:
+                    if restart:
+                        store.reset(job_id)
+                    job = _jobs[job_id] = BackgroundJob(job_id, func, path).start()
+                    break
+                if not stop:
+                    job = running
+                    break
+                stop = False
+            # 止めるのを待つあいだはロックを放す（終わったスレッドが自分を一覧から外す）
+            running.cancel()
+            running.join()
+    finally:
+        store.close()
+    st.session_state[SESSION_KEY] = job
+    return job
+
+
+def _frame(job, results, generation, build_frame):
+    # 前回までに作った分はセッションに残し、新しく終わった結果だけを DataFrame にして後ろに足す
+    import pandas as pd
+    import streamlit as st
+
+    cached = st.session_state.get(FRAME_KEY)
+    if cached is not None and cached[0] is job and cached[1] == generation and cached[2] <= len(results):
+        df, count = cached[3], cached[2]
+        if count < len(results):
+            new = build_frame(results[count:]).fillna("")
+            columns_changed = not new.columns.equals(df.columns)
+            df = pd.concat([df, new], ignore_index=True)
+            if columns_changed:
+                # 片方にしかない列（エラーなど）は空にする
+                df = df.fillna("")
+    else:
+        df = build_frame(results).fillna("")
+    st.session_state[FRAME_KEY] = (job, generation, len(results), df)
+    return df
+
+
+def render_job(job, build_frame, filter_frame=None):
+    """進捗・処理速度・中止ボタンと結果の表を出す（実行中は REFRESH_SECONDS ごとに描き直す）
+
+    build_frame(結果のリスト) は結果を表の行にした DataFrame を返す関数で、新しく終わった結果の分だけ
+    呼ばれる。filter_frame(DataFrame) は表全体にかける絞り込み（重複の除去など）。
+    """
+    import streamlit as st
+
+    live = job.running
+
+    @st.fragment(run_every=REFRESH_SECONDS if live else None)
+    def view():
+        results, generation, done, processed, elapsed = job.snapshot()
+        total = job.total
+        st.progress(done / total if total else 1.0, text=f"{done} / {total} 件")
+        if job.running:
+            rate = processed / elapsed if elapsed > 0 else 0.0
+            remaining = f"・残り約{(total - done) / rate:.0f}秒" if rate > 0 else ""
+            cols = st.columns([4, 1])
+            if job.cancelling:
+                cols[0].caption("中止しています（処理中のURLが終わるのを待っています）")
+            else:
+                cols[0].caption(f"{rate:.2f} 件/秒{remaining}")
+            cols[1].button("中止", on_click=job.cancel, disabled=job.cancelling)
+        elif job.status == FAILED:
+            st.error(f"処理が止まりました: {job.error}")
+        elif job.status == CANCELLED:
+            st.warning(f"中止しました（未処理は{total - done}件です）")
+            if st.button("続きから処理する"):
+                # セッションから外せば、次の実行でチェックポイントの続きから新しく動かす
+                st.session_state.pop(SESSION_KEY, None)
+                st.rerun()
+        elif processed:
+            st.caption(f"{processed}件を{elapsed:.1f}秒で処理しました（{processed / elapsed:.2f} 件/秒）")
+        df = _frame(job, results, generation, build_frame)
+        if filter_frame is not None:
+            df = filter_frame(df)
+        st.dataframe(df, use_container_width=True)
+        if live and not job.running:
+            # 終わったら画面全体を描き直して自動更新を止める
+            st.rerun()
+
+    view()
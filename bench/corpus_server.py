@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ベンチマーク用のコーパスを配信するローカルHTTPサーバー
+
+例:
+    python bench/corpus_server.py --port 8000
+"""
+
+import argparse
+import functools
+import os
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+
+class CorpusHandler(SimpleHTTPRequestHandler):
+    # 本番のサイトと同じく接続を使い回せるようにする（ヘッダーと本文を別々に送るので Nagle は切る）
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def end_headers(self):
+        # 毎回取得させる（HTTPキャッシュの再検証を計測に混ぜない）
+        self.send_header("Cache-Control", "no-store")
+        super().end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(corpus_dir=CORPUS_DIR, host="127.0.0.1", port=0):
+    """別スレッドでサーバーを起動し、(サーバー, ベースURL) を返す（port=0 なら空いているポート）"""
+    handler = functools.partial(CorpusHandler, directory=corpus_dir)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ベンチマーク用コーパスを配信します")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--corpus", default=CORPUS_DIR)
+    args = parser.parse_args()
+    server = ThreadingHTTPServer(("127.0.0.1", args.port),
+                                 functools.partial(CorpusHandler, directory=args.corpus))
+    print(f"http://127.0.0.1:{args.port}/ で {args.corpus} を配信中（Ctrl+C で終了）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+抽出器のベンチマーク（速度・工程ごとの時間・ピークメモリ・項目ごとの正解率）
+
+bench/corpus の保存済みページをローカルのHTTPサーバーから配信し、GMO.py（address）と
+GMOのコピー.py（full）の get_company_info を順に実行する。正解は bench/expected.json。
+"addresses" の正解があるページでは、住所一覧のモード（get_all_addresses）の行も照合する。
+工程ごとの時間（入れ子の分を除いた正味の時間）は抽出器の METRICS から取る。
+
+例:
+    python bench/run_bench.py
+    python bench/run_bench.py --repeat 20 --json result.json
+    python bench/run_bench.py --parse-workers 8    # 解析を別プロセスで行う
+    python bench/run_bench.py --baseline result.json   # 遅くなった・正解率が下がったら終了コード1
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import gmo_cli  # noqa: E402
+import http_session  # noqa: E402
+import parse_pool  # noqa: E402
+from corpus_server import CORPUS_DIR, serve  # noqa: E402
+
+EXPECTED_PATH = os.path.join(BENCH_DIR, "expected.json")
+REPEAT = 5
+# 基準より何割まで遅くなっても許すか（計測のぶれを見込む）
+TOLERANCE = 0.2
+
+
+def load_expected(path=EXPECTED_PATH):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def run_pass(extractor, urls):
+    results = {}
+    # 抽出結果のメモ化が効くと2回目以降は計測にならないので毎回捨てる
+    extractor.EXTRACTION_CACHE.invalidate()
+    for page, url in urls:
+        results[page] = extractor.get_company_info(url)
+    return results
+
+
+def score(results, expected, name):
+    """項目ごとの一致数を数え、(一致数, 項目数, 不一致の一覧) を返す"""
+    matched = total = 0
+    misses = []
+    for page, fields in expected.items():
+        want = fields.get(name)
+        if want is None:
+            continue
+        got = results.get(page, {})
+        for field, value in want.items():
+            total += 1
+            if got.get(field, "") == value:
+                matched += 1
+            else:
+                misses.append((page, field, value, got.get(field, "")))
+    return matched, total, misses
+
+
+def score_address_lists(results, expected):
+    """住所一覧の行を正解と順に照合し、(一致数, 項目数, 不一致の一覧) を返す"""
+    matched = total = 0
+    misses = []
+    for page, fields in expected.items():
+        want = fields.get("addresses")
+        if want is None:
+            continue
+        # 住所が取れなかったページの空の行は数えない
+        got = [row for row in results.get(page, []) if row.get("所在地")]
+        for i in range(max(len(want), len(got))):
+            want_row = want[i] if i < len(want) else {}
+            got_row = got[i] if i < len(got) else {}
+            for field in want_row or got_row:
+                if field == "URL":
+                    continue
+                total += 1
+                if want_row.get(field, "") == got_row.get(field, ""):
+                    matched += 1
+                else:
+                    misses.append((f"{page}#{i + 1}", field, want_row.get(field, ""), got_row.get(field, "")))
+    return matched, total, misses
+
+
+def bench_extractor(name, base_url, expected, repeat):
+    extractor = gmo_cli.load_extractor(name)
+    urls = [(page, base_url + page) for page in expected if name in expected[page]]
+
+    # 1回目はコネクションの確立などを含むので計測しない
+    results = run_pass(extractor, urls)
+    matched, total, misses = score(results, expected, name)
+    lists = {page: extractor.get_all_addresses(base_url + page) for page in expected if "addresses" in expected[page]}
+    list_matched, list_total, list_misses = score_address_lists(lists, expected)
+
+    # 工程ごとの時間と住所が取れた方法は抽出器に組み込みの計測値から取る
+    extractor.METRICS.reset()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        run_pass(extractor, urls)
+    elapsed = time.perf_counter() - start
+    summary = extractor.METRICS.summary()
+
+    # tracemalloc は遅くなるので、速度とは別に1回だけ回してピークを取る
+    tracemalloc.start()
+    try:
+        run_pass(extractor, urls)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    pages = len(urls) * repeat
+    return {
+        "pages": len(urls),
+        "pages_per_sec": pages / elapsed if elapsed else 0.0,
+        "ms_per_page": elapsed * 1000 / pages if pages else 0.0,
+        "phases_ms_per_page": {phase: p["seconds"] * 1000 / pages for phase, p in summary["phases"].items()},
+        "peak_memory_kib": peak / 1024,
+        "strategies": summary["strategies"],
+        "accuracy": matched / total if total else 1.0,
+        "matched": matched,
+        "fields": total,
+        "misses": [{"page": p, "field": f, "expected": e, "got": g} for p, f, e, g in misses + list_misses],
+        "address_list_accuracy": list_matched / list_total if list_total else 1.0,
+        "address_list_matched": list_matched,
+        "address_list_fields": list_total,
+    }
+
+
+def report(results, verbose=False, out=sys.stdout):
+    for name, r in results.items():
+        print(f"[{name}] {r['pages']}ページ  {r['pages_per_sec']:.1f} pages/sec  "
+              f"({r['ms_per_page']:.2f} ms/page)  ピークメモリ {r['peak_memory_kib']:.0f} KiB  "
+              f"正解率 {r['accuracy']:.1%} ({r['matched']}/{r['fields']})", file=out)
+        for phase, ms in r["phases_ms_per_page"].items():
+            print(f"    {phase:<16} {ms:8.3f} ms/page", file=out)
+        print("    方法: " + ", ".join(f"{k}={v}" for k, v in r["strategies"].items()), file=out)
+        print(f"    住所一覧 正解率 {r['address_list_accuracy']:.1%} "
+              f"({r['address_list_matched']}/{r['address_list_fields']})", file=out)
+        if verbose:
+            for miss in r["misses"]:
+                print(f"    不一致 {miss['page']} {miss['field']}: 期待 {miss['expected']!r} / 結果 {miss['got']!r}",
+                      file=out)
+
+
+def regressions(results, baseline, tolerance=TOLERANCE):
+    """基準と比べて遅くなった・正解率が下がったものの説明の一覧"""
+    found = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if r["accuracy"] < base["accuracy"]:
+            found.append(f"{name}: 正解率が下がりました {base['accuracy']:.1%} → {r['accuracy']:.1%}")
+        if r.get("address_list_accuracy", 1.0) < base.get("address_list_accuracy", 0.0):
+            found.append(f"{name}: 住所一覧の正解率が下がりました "
+                         f"{base['address_list_accuracy']:.1%} → {r['address_list_accuracy']:.1%}")
+        if r["pages_per_sec"] < base["pages_per_sec"] * (1 - tolerance):
+            found.append(f"{name}: 遅くなりました {base['pages_per_sec']:.1f} → {r['pages_per_sec']:.1f} pages/sec")
+    return found
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="抽出器のベンチマークを実行します")
+    parser.add_argument("-e", "--extractor", action="append", choices=sorted(gmo_cli.EXTRACTORS),
+                        help="対象の抽出器（複数指定可、省略時はすべて）")
+    parser.add_argument("-n", "--repeat", type=int, default=REPEAT, help="コーパス全体を繰り返す回数")
+    parser.add_argument("-p", "--parse-workers", type=int, default=parse_pool.WORKERS,
+                        help="HTMLの解析を行うプロセスの数（0なら取得したスレッドで解析する）")
+    parser.add_argument("--corpus", default=CORPUS_DIR, help="配信するコーパスのディレクトリ")
+    parser.add_argument("--expected", default=EXPECTED_PATH, help="正解のJSON")
+    parser.add_argument("--json", help="結果をJSONで保存する（--baseline に渡せる）")
+    parser.add_argument("--baseline", help="以前の --json の結果と比べ、悪くなっていたら終了コード1")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="許容する速度の低下の割合")
+    parser.add_argument("-v", "--verbose", action="store_true", help="正解と一致しなかった項目を表示する")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    # HTTPキャッシュを使うと取得の時間が測れないので切る
+    http_session.USE_CACHE = False
+    parse_pool.configure(args.parse_workers)
+    expected = load_expected(args.expected)
+    server, base_url = serve(args.corpus)
+    try:
+        results = {name: bench_extractor(name, base_url, expected, args.repeat)
+                   for name in args.extractor or sorted(gmo_cli.EXTRACTORS)}
+    finally:
+        server.shutdown()
+
+    report(results, args.verbose)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for message in found:
+            print(message, file=sys.stderr)
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
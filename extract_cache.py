@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+抽出結果のメモ化（Streamlit の再実行をまたいで保持する）
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+# メモリに保持する抽出結果の件数の上限
+MAX_ENTRIES = 5000
+
+# モジュールはStreamlitの再実行でも読み込み直されないので、ここに置いたキャッシュは残る
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def content_hash(content):
+    """レスポンス本文のハッシュ"""
+    return hashlib.sha1(content).hexdigest()
+
+
+def extractor_version(*parts):
+    """パターンやキーワードの定義からバージョン文字列を作る（定義が変われば変わる）"""
+    data = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()[:12]
+
+
+def _copy(value):
+    # 結果の辞書は呼び出し側で書き換えられてもよいように複製して出し入れする
+    if isinstance(value, dict):
+        return dict(value)
+    if isinstance(value, tuple):
+        return tuple(_copy(v) for v in value)
+    return value
+
+
+class ExtractionCache:
+    """(URL, 本文ハッシュ, 抽出器バージョン) をキーにしたLRUキャッシュ"""
+
+    def __init__(self, version, max_entries=MAX_ENTRIES, extra_version=None):
+        self.version = version
+        # 読み込みのあとで変わりうるバージョン（抽出器の登録簿など）を返す関数
+        self.extra_version = extra_version
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, url, content, func):
+        """キャッシュにあればそれを返し、なければ func(url, content) の結果を保存して返す"""
+        extra = self.extra_version() if self.extra_version is not None else None
+        key = (url, content_hash(content), self.version, extra)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return _copy(self._entries[key])
+            self.misses += 1
+        result = func(url, content)
+        with self._lock:
+            self._entries[key] = _copy(result)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result
+
+    def invalidate(self, url=None):
+        """指定URL（省略時はすべて）の結果を捨てる"""
+        with self._lock:
+            if url is None:
+                self._entries.clear()
+            else:
+                for key in [k for k in self._entries if k[0] == url]:
+                    del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def get_cache(name, version, max_entries=MAX_ENTRIES, extra_version=None):
+    """名前ごとのキャッシュを返す（バージョンが変わっていたら中身を捨てて作り直す）
+
+    extra_version() の値もキーに含めるので、それが変わると以前の結果は使われなくなる。
+    """
+    with _caches_lock:
+        cache = _caches.get(name)
+        if cache is None or cache.version != version:
+            cache = _caches[name] = ExtractionCache(version, max_entries, extra_version)
+        return cache
+
+
+def clear_all():
+    """すべての抽出結果キャッシュを捨てる"""
+    with _caches_lock:
+        _caches.clear()
@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+会社概要ページから項目（所在地・郵便番号・電話番号・FAX・営業時間・免許番号・設立など）を取り出す
+抽出器の登録簿（GMO.py と GMOのコピー.py で共有する）
+
+項目名 → 値を計算する関数 を EXTRACTORS に登録しておき、呼び出し側は必要な項目だけを選ぶ。
+住所のパターンは読み込み時に一度だけコンパイルし、キーワードの照合器は選ばれた項目の組ごとに
+一度だけ作って使い回す。所在地だけなら、ほかの項目のキーワードの照合はしない。
+
+    values = extract_fields(page, ["所在地", "電話番号"])
+"""
+
+import re
+import threading
+from contextlib import nullcontext
+
+from address_matcher import AddressMatcher
+from gazetteer import CITY_WARDS_RE, GAZETTEER, MUNICIPALITY_RE, PREFECTURES_RE, WARDS_RE
+from keyword_scanner import FallbackScanner, KeywordScanner
+from metrics import NONE
+
+ADDRESS_KEYWORDS = [
+    "所在地", "住所", "本社", "Head Office", "Location", "Map", "company-info", "company-profile", "about-section", "access-info", "location-map", "address", "contact-info"
+]
+
+KEYWORDS = {
+    "営業時間": ["営業時間", "受付時間", "営業日", "open", "business hours"],
+    "郵便番号": ["〒", "郵便番号", "zip", "postal"],
+    "所在地": ADDRESS_KEYWORDS,
+    "定休日": ["定休日", "休業日", "休日", "closed", "休館日"],
+    "アクセス": ["アクセス", "access", "交通", "最寄駅"],
+    "駐車場": ["駐車場", "parking"],
+    "電話番号": ["電話番号", "TEL", "tel.", "電話", "phone"],
+    "電話受付時間": ["電話受付時間", "受付時間", "電話受付", "phone reception"],
+    "FAX": ["FAX", "fax."],
+    "免許番号": ["免許番号", "許可番号", "license", "registration"],
+    "設立（西暦）": ["設立", "創業", "設立年月日", "創立", "established", "founded"]
+}
+
+# 見出しで所在地とわかっている値（dl・表の行など）向けの住所パターン（番地がなくてもよい）
+ADDRESS_PATTERNS = [
+    PREFECTURES_RE + MUNICIPALITY_RE + r"[^\n]*?((丁目)?\d{1,4}[-－]?\d{0,4}|\d{1,4}番地?\d{0,4}|[０-９]{1,4}丁目)?[^\n]*?(ビル|号室|F|階|B)?[^\n]*",
+    CITY_WARDS_RE + r"[^\n]{0,40}?((丁目)?\d{1,4}[-－]?\d{0,4}|\d{1,4}番地?\d{0,4})[^\n]*?(ビル|号室|F|階|B)?[^\n]*",
+    WARDS_RE + r"[^\n]{0,40}?((丁目)?\d{1,4}[-－]?\d{0,4}|\d{1,4}番地?\d{0,4})[^\n]*?(ビル|号室|F|階|B)?[^\n]*",
+]
+
+# 本文の行から探すとき向けの住所パターン（「1-2-3」か「1番2号」の番地まであるものだけ）
+NUMBERED_ADDRESS_PATTERNS = [
+    PREFECTURES_RE + MUNICIPALITY_RE + r"[^\n]{0,40}?\d{1,4}[-－]\d{1,4}([-－]\d{1,4})?[^\n]*?(ビル|号室|F|階|B)?[^\n]*",
+    PREFECTURES_RE + MUNICIPALITY_RE + r"[^\n]{0,40}?\d{1,4}番\d{1,4}号[^\n]*",
+    CITY_WARDS_RE + r"[^\n]{0,40}?\d{1,4}[-－]\d{1,4}([-－]\d{1,4})?[^\n]*?(ビル|号室|F|階|B)?[^\n]*",
+    CITY_WARDS_RE + r"[^\n]{0,40}?\d{1,4}番\d{1,4}号[^\n]*",
+    WARDS_RE + r"[^\n]{0,40}?\d{1,4}[-－]\d{1,4}([-－]\d{1,4})?[^\n]*?(ビル|号室|F|階|B)?[^\n]*",
+    WARDS_RE + r"[^\n]{0,40}?\d{1,4}番\d{1,4}号[^\n]*",
+]
+
+# パターンは読み込み時に一度だけコンパイルし、前段フィルタ付きで定義順に照合する
+ADDRESS_MATCHER = AddressMatcher(ADDRESS_PATTERNS, validate=GAZETTEER.is_consistent)
+NUMBERED_ADDRESS_MATCHER = AddressMatcher(NUMBERED_ADDRESS_PATTERNS, validate=GAZETTEER.is_consistent)
+
+SPACES_RE = re.compile(r'[ \u3000]+')
+NOISE_RE = re.compile(r"\[.*?\]|GoogleMAP|【.*?】")
+
+# 表の見出しと、表やdl以外で探すキーワード（parse_page の text_keywords に渡す）
+HEAD_OFFICE_KEYS = ["本社", "本店", "本店所在地", "本社所在地"]
+LOCATION_KEYS = ["所在地", "住所"]
+TEXT_ADDRESS_KEYWORDS = ["本社住所", "所在地", "住所"]
+
+# 各項目の値のパターンと、キーワードの近くで取れなかったときに本文全体から探すパターン
+ZIP_RE = re.compile(r"〒?\d{3}-\d{4}")
+ZIP_LINE_RE = re.compile(r"^〒?\d{3}-\d{4}")
+PHONE_RE = re.compile(r"\d{2,4}-\d{2,4}-\d{3,4}")
+TIME_RE = re.compile(r"\d{1,2}:\d{2}[～~\-]\d{1,2}:\d{2}")
+LICENSE_RE = re.compile(r"\d{1,4}号")
+YEAR_RE = re.compile(r"\d{4}年")
+TEL_FALLBACK_RE = re.compile(r"(tel\.|TEL|電話番号)[^\d]*(\d{2,4}-\d{2,4}-\d{3,4})", re.IGNORECASE)
+FAX_FALLBACK_RE = re.compile(r"(fax\.|FAX)[^\d]*(\d{2,4}-\d{2,4}-\d{3,4})", re.IGNORECASE)
+HOLIDAY_FALLBACK_RE = re.compile(r"(GW|年末年始|夏季休業|定休日)[^\n]*")
+LICENSE_FALLBACK_RE = re.compile(r"(免許番号|許可番号)[^\d]*(\d{1,4}号)")
+ESTABLISHED_FALLBACK_RE = re.compile(r"(設立|創業|創立)[^\d]*(\d{4})年")
+# 項目 → (本文全体から探すパターン, 値にするグループ, 目印の文字, 目印から遡る文字数)。
+# ページごとに選ばれた項目の分を FallbackScanner の1回の走査でまとめて探す
+# （どのマッチも、先頭から遡る文字数以内に目印の文字のどれかを含むこと）
+FALLBACK_PATTERNS = {
+    "郵便番号": (ZIP_RE, 0, "-", 4),
+    "電話番号": (TEL_FALLBACK_RE, 2, "tT電", 0),
+    "FAX": (FAX_FALLBACK_RE, 2, "fF", 0),
+    "営業時間": (TIME_RE, 0, ":", 2),
+    "定休日": (HOLIDAY_FALLBACK_RE, 0, "G末夏定", 1),
+    "免許番号": (LICENSE_FALLBACK_RE, 2, "免許", 0),
+    "設立（西暦）": (ESTABLISHED_FALLBACK_RE, 2, "設創", 0),
+}
+
+# 選ばれた項目の組 → キーワードの照合器・本文全体から探すパターンの照合器
+_scanners = {}
+_fallback_scanners = {}
+_scanners_lock = threading.Lock()
+# register() で項目を変えるたびに増やす（抽出結果のキャッシュとジョブのキーに含める）
+_registry_version = 0
+
+
+def strip_noise(val):
+    """地図リンクの文字（「[地図]」「GoogleMAP」など）を取り除く"""
+    return NOISE_RE.sub("", val)
+
+
+def keyword_scanner(categories):
+    """KEYWORDS のうち categories のカテゴリだけを照合する走査器（組ごとに一度だけ作る）"""
+    categories = tuple(c for c in categories if c in KEYWORDS)
+    with _scanners_lock:
+        scanner = _scanners.get(categories)
+        if scanner is None:
+            scanner = _scanners[categories] = KeywordScanner({c: KEYWORDS[c] for c in categories})
+        return scanner
+
+
+def fallback_scanner(fields):
+    """FALLBACK_PATTERNS のうち fields の項目だけをまとめて探す照合器（組ごとに一度だけ作る）"""
+    fields = tuple(f for f in fields if f in FALLBACK_PATTERNS)
+    with _scanners_lock:
+        scanner = _fallback_scanners.get(fields)
+        if scanner is None:
+            scanner = _fallback_scanners[fields] = FallbackScanner(
+                {f: (FALLBACK_PATTERNS[f][0], *FALLBACK_PATTERNS[f][2:]) for f in fields})
+        return scanner
+
+
+class Extraction:
+    """1ページ分の抽出（計算した項目の値と、項目どうしで使い回すキーワードの走査結果を持つ）
+
+    address_strategies は住所を探す方法の (主な方法, 本文から探す方法) の組。
+    metrics を渡すと工程の時間と住所が取れた方法を記録する。
+    """
+
+    def __init__(self, page, fields, matcher=ADDRESS_MATCHER, address_strategies=None, metrics=None):
+        self.page = page
+        self.fields = list(fields)
+        self.matcher = matcher
+        self.address_strategies = address_strategies or ROW_ADDRESS_STRATEGIES
+        self.metrics = metrics
+        self.values = {}
+        # 主な方法で住所が取れず、本文から探したか（会社概要ページを探す目安）
+        self.fell_back = False
+        self._hits = None
+        self._fallbacks = None
+
+    def phase(self, name):
+        return self.metrics.phase(name) if self.metrics is not None else nullcontext()
+
+    def set_strategy(self, strategy):
+        if self.metrics is not None:
+            self.metrics.set_strategy(strategy)
+
+    @property
+    def hits(self):
+        """選ばれた項目（と、その計算に使う項目）のキーワードを1回の走査でまとめて探した結果"""
+        if self._hits is None:
+            with self.phase("keywords"):
+                self._hits = keyword_scanner(self._categories()).scan(self.page.text)
+        return self._hits
+
+    def fallback(self, field):
+        """本文全体から探した項目の値（選ばれた項目の分を最初に呼ばれたときに1回の走査でまとめて探す）"""
+        if field not in FALLBACK_PATTERNS:
+            return ""
+        if self._fallbacks is None:
+            with self.phase("fallbacks"):
+                self._fallbacks = fallback_scanner(self._categories()).scan(self.page.text)
+        m = self._fallbacks.get(field)
+        return m.group(FALLBACK_PATTERNS[field][1]) if m else ""
+
+    def _categories(self):
+        # 選ばれた項目と、その計算に使う項目
+        categories = []
+        for field in self.fields:
+            for name in (field, *DEPENDS.get(field, ())):
+                if name not in categories:
+                    categories.append(name)
+        return categories
+
+    def get(self, field):
+        """項目の値（まだ計算していなければ登録された関数で計算する）"""
+        if field not in self.values:
+            self.values[field] = EXTRACTORS[field](self)
+        return self.values[field]
+
+    def extract(self):
+        """選ばれた項目の {項目: 値}"""
+        return {field: self.get(field) for field in self.fields}
+
+
+def _match_address(ex, val):
+    addr_match = ex.matcher.search(val)
+    if addr_match:
+        # 連続した空白（半角・全角）を半角スペース1つにまとめる
+        return SPACES_RE.sub(' ', addr_match.group().strip())
+    return ""
+
+
+def address_from_dl(ex):
+    # <dt>所在地</dt> の直後の <dd>
+    for key, val in ex.page.dl_rows:
+        if "所在地" in key:
+            address = _match_address(ex, val)
+            if address:
+                return address
+    return ""
+
+
+def address_from_table(ex, keys):
+    # <th> の見出しが keys のどれかを含む行の <td>
+    for key, val in ex.page.table_rows:
+        if any(k in key for k in keys):
+            address = _match_address(ex, strip_noise(val))
+            if address:
+                return address
+    return ""
+
+
+def address_from_text_blocks(ex):
+    # テーブルやdl以外の「本社住所」「所在地」「住所」キーワードを含むテキスト（直後の兄弟要素も連結済み）
+    for candidate in ex.page.text_blocks:
+        address = _match_address(ex, candidate)
+        if address:
+            return address
+    return ""
+
+
+def address_near_keywords(ex):
+    # 住所のキーワードを含む行と、その後の2行まで（キーワードを含まない行だけ）を連結して探す
+    hits = ex.hits
+    lines = hits.lines
+    for i in hits.lines_for("所在地"):
+        line = lines[i]
+        # 直後の行が郵便番号なら、その次の行を住所とする
+        if i + 1 < len(lines) and ZIP_LINE_RE.match(lines[i+1].strip()):
+            if i + 2 < len(lines):
+                addr_match = ex.matcher.search(lines[i+2].strip())
+                if addr_match:
+                    return addr_match.group().strip()
+        else:
+            candidate = line
+            if i + 1 < len(lines):
+                next_line = lines[i + 1].strip()
+                if next_line and not hits.contains("所在地", i + 1):
+                    candidate += next_line
+            if i + 2 < len(lines):
+                next2_line = lines[i + 2].strip()
+                if next2_line and not hits.contains("所在地", i + 2):
+                    candidate += next2_line
+            addr_match = ex.matcher.search(candidate)
+            if addr_match:
+                return addr_match.group().strip()
+    return ""
+
+
+def address_in_text(ex):
+    # ページ全体のテキストから最初に見つかった住所
+    addr_match = ex.matcher.search(ex.page.text)
+    return addr_match.group().strip() if addr_match else ""
+
+
+# 住所を探す方法を優先順に（計測での名前, 関数）。主な方法で取れなければ本文から探す
+# 1. <dt>所在地</dt> の直後の <dd> を優先
+# 2. 表の行（本社・本店 → 所在地・住所）
+# 3. テーブルやdl以外のキーワードを含むテキスト
+ROW_ADDRESS_STRATEGIES = (
+    [
+        ("dl", address_from_dl),
+        ("head_office_row", lambda ex: address_from_table(ex, HEAD_OFFICE_KEYS)),
+        ("location_row", lambda ex: address_from_table(ex, LOCATION_KEYS)),
+    ],
+    [("text", address_from_text_blocks)],
+)
+# キーワードを含む行の近く → ページ全体のテキスト
+KEYWORD_ADDRESS_STRATEGIES = (
+    [("keyword_line", address_near_keywords)],
+    [("text", address_in_text)],
+)
+
+
+def _find_address(ex, strategies):
+    # 順に試し、取れた方法を計測に記録する
+    for name, func in strategies:
+        with ex.phase(name):
+            address = func(ex)
+        if address:
+            ex.set_strategy(name)
+            return address
+    return ""
+
+
+def extract_address(ex):
+    primary, fallback = ex.address_strategies
+    address = _find_address(ex, primary)
+    if not address:
+        ex.fell_back = True
+        address = _find_address(ex, fallback)
+        if not address:
+            ex.set_strategy(NONE)
+    return address
+
+
+def _keyword_value(ex, field, value_re, after_line):
+    # キーワードの行（とその後の after_line 行）から探し、なければ本文全体から探す
+    return ex.hits.extract(field, value_re, after_line=after_line) or ex.fallback(field)
+
+
+def extract_zip(ex):
+    return _keyword_value(ex, "郵便番号", ZIP_RE, 1)
+
+
+def extract_phone(ex):
+    return _keyword_value(ex, "電話番号", PHONE_RE, 1)
+
+
+def extract_fax(ex):
+    return _keyword_value(ex, "FAX", PHONE_RE, 1)
+
+
+def extract_business_hours(ex):
+    return _keyword_value(ex, "営業時間", TIME_RE, 1)
+
+
+def extract_phone_hours(ex):
+    # 見つからなければ営業時間と同じとみなす
+    return _keyword_value(ex, "電話受付時間", TIME_RE, 1) or ex.get("営業時間")
+
+
+def extract_holiday(ex):
+    return _keyword_value(ex, "定休日", None, 1)
+
+
+def extract_access(ex):
+    return _keyword_value(ex, "アクセス", None, 2)
+
+
+def extract_parking(ex):
+    return _keyword_value(ex, "駐車場", None, 2)
+
+
+def extract_license(ex):
+    return _keyword_value(ex, "免許番号", LICENSE_RE, 2)
+
+
+def extract_established(ex):
+    established = ex.hits.extract("設立（西暦）", YEAR_RE, after_line=2)
+    if not established:
+        year = ex.fallback("設立（西暦）")
+        established = year + "年" if year else ""
+    return established
+
+
+# 項目 → 値を計算する関数（Extraction を受け取る）
+EXTRACTORS = {
+    "営業時間": extract_business_hours,
+    "郵便番号": extract_zip,
+    "所在地": extract_address,
+    "定休日": extract_holiday,
+    "アクセス": extract_access,
+    "駐車場": extract_parking,
+    "電話番号": extract_phone,
+    "電話受付時間": extract_phone_hours,
+    "FAX": extract_fax,
+    "免許番号": extract_license,
+    "設立（西暦）": extract_established,
+}
+# 値の計算にほかの項目を使うもの（そのキーワードもまとめて照合する）
+DEPENDS = {"電話受付時間": ("営業時間",)}
+
+
+def register(field, func, keywords=None, depends=(), fallback=None):
+    """項目を追加する（keywords を渡すとキーワードの照合にも加える）
+
+    fallback は本文全体から探すパターンの (パターン, 値にするグループ, 目印の文字, 遡る文字数)
+    （FALLBACK_PATTERNS と同じ形。登録した関数からは Extraction.fallback で値を読む）。
+    作ってあった照合器は捨て、登録簿のバージョンを上げる
+    （それまでの規則で作った抽出結果のキャッシュやジョブの結果は使われなくなる）。
+    """
+    global _registry_version
+    with _scanners_lock:
+        EXTRACTORS[field] = func
+        if keywords is not None:
+            KEYWORDS[field] = list(keywords)
+        if depends:
+            DEPENDS[field] = tuple(depends)
+        if fallback is not None:
+            FALLBACK_PATTERNS[field] = tuple(fallback)
+        _scanners.clear()
+        _fallback_scanners.clear()
+        _registry_version += 1
+
+
+def registry_version():
+    """登録簿のバージョン（読み込んだままなら0）"""
+    return _registry_version
+
+
+def job_name(name, version):
+    """パターンなどの定義（version）や登録簿を変えたあとは別のジョブになるように、ジョブの名前にバージョンを付ける"""
+    name = f"{name}@{version}"
+    return f"{name}+{_registry_version}" if _registry_version else name
+
+
+def extract_fields(page, fields, **options):
+    """ページ（PageIndex）から選んだ項目だけを計算して {項目: 値} を返す（options は Extraction の引数）"""
+    return Extraction(page, fields, **options).extract()
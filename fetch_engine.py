@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+複数URLの並列取得エンジン
+"""
+
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+import http_session
+import politeness
+from http_session import ThrottledError
+from politeness import PolitenessScheduler
+
+# 全体の同時実行数と、同一ホストへの同時接続数の上限
+MAX_WORKERS = 16
+PER_HOST_LIMIT = 2
+# アクセス制限（429/503）を受けたURLを待ち行列に戻す回数の上限
+MAX_ATTEMPTS = 4
+# 中止の指示を確かめる間隔（秒）
+CANCEL_POLL = 0.2
+
+
+def host_of(url):
+    """URLからホスト名を取り出す（取れなければURLそのもの）"""
+    try:
+        host = urlsplit(url).hostname
+    except ValueError:
+        host = None
+    return host or url
+
+
+def iter_fetch(urls, func, max_workers=MAX_WORKERS, per_host=PER_HOST_LIMIT,
+               scheduler=None, max_attempts=MAX_ATTEMPTS, cancel=None):
+    """func(url) を並列実行し、完了した順に (入力順の番号, url, 結果) を返す
+
+    送信間隔は scheduler（省略時は既定の PolitenessScheduler）がホストごとに決める。
+    func が ThrottledError を投げたURLは、そのホストを待たせたうえで待ち行列の後ろに戻す。
+    cancel（threading.Event）がセットされたら新しいURLは投入せず、実行中のものの結果も返さずに終わる。
+    """
+    if scheduler is None:
+        scheduler = PolitenessScheduler()
+
+    def task(url):
+        scheduler.check_robots(url)
+        # 会社概要ページをたどるときなど、func の中の追加の取得も同じ送信間隔に従わせる
+        with politeness.using(scheduler):
+            return func(url)
+
+    # ホストごとの待ち行列（入力順を保ったまま振り分ける）
+    queues = OrderedDict()
+    for i, url in enumerate(urls):
+        queues.setdefault(host_of(url), deque()).append((i, url, 1))
+
+    active = {}
+    running = {}
+    http_session.add_observer(scheduler.observe)
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while queues or running:
+                if cancel is not None and cancel.is_set():
+                    for future in running:
+                        future.cancel()
+                    return
+                # 上限と送信間隔に余裕のあるホストから1件ずつ順番に投入する
+                # （遅いホストや制限中のホストが、他のホストを待たせないように）
+                next_ready = None
+                submitted = True
+                while submitted and len(running) < max_workers:
+                    submitted = False
+                    for host in list(queues):
+                        if len(running) >= max_workers:
+                            break
+                        if active.get(host, 0) >= per_host:
+                            continue
+                        ready = scheduler.ready_at(host)
+                        if ready > time.monotonic():
+                            next_ready = ready if next_ready is None else min(next_ready, ready)
+                            continue
+                        scheduler.acquire(host)
+                        i, url, attempt = queues[host].popleft()
+                        if not queues[host]:
+                            del queues[host]
+                        active[host] = active.get(host, 0) + 1
+                        running[executor.submit(task, url)] = (i, url, host, attempt)
+                        submitted = True
+
+                timeout = None if next_ready is None else max(0.0, next_ready - time.monotonic())
+                if cancel is not None:
+                    # 中止に気づけるように待ち時間を区切る
+                    timeout = CANCEL_POLL if timeout is None else min(timeout, CANCEL_POLL)
+                if not running:
+                    time.sleep(timeout or 0)
+                    continue
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i, url, host, attempt = running.pop(future)
+                    active[host] -= 1
+                    try:
+                        result = future.result()
+                    except ThrottledError as e:
+                        scheduler.throttled(host, e.retry_after)
+                        if attempt < max_attempts:
+                            queues.setdefault(host, deque()).append((i, url, attempt + 1))
+                            continue
+                        result = {"URL": url, "エラー": f"取得できませんでした: {e}"}
+                    except Exception as e:
+                        result = {"URL": url, "エラー": f"取得できませんでした: {e}"}
+                    yield i, url, result
+    finally:
+        http_session.remove_observer(scheduler.observe)
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+住所の地名辞書（都道府県・政令指定都市とその区・東京23区）
+
+地名はトライ木に入れておき、ページの文字列から地名の出現位置（住所の起点）を探したり、
+都道府県と市区の組み合わせが正しいかを確かめたりするのに使う。
+トライ木は共通の接頭辞をまとめた正規表現にも変換できる（探索は re の C 実装に任せる）。
+
+都道府県を省いて書かれた住所として拾うのは、従来のパターンと同じく「〇〇市〇〇区」と
+「〇〇区」の形だけなので、市区町村の全件ではなく区のある市と東京23区だけを持つ。
+"""
+
+import re
+
+PREFECTURES = (
+    "北海道", "青森県", "岩手県", "宮城県", "秋田県", "山形県", "福島県",
+    "茨城県", "栃木県", "群馬県", "埼玉県", "千葉県", "東京都", "神奈川県",
+    "新潟県", "富山県", "石川県", "福井県", "山梨県", "長野県", "岐阜県", "静岡県", "愛知県",
+    "三重県", "滋賀県", "京都府", "大阪府", "兵庫県", "奈良県", "和歌山県",
+    "鳥取県", "島根県", "岡山県", "広島県", "山口県",
+    "徳島県", "香川県", "愛媛県", "高知県",
+    "福岡県", "佐賀県", "長崎県", "熊本県", "大分県", "宮崎県", "鹿児島県", "沖縄県",
+)
+
+# 政令指定都市 → (都道府県, 区)
+DESIGNATED_CITIES = {
+    "札幌市": ("北海道", ("中央区", "北区", "東区", "白石区", "豊平区", "南区", "西区", "厚別区", "手稲区", "清田区")),
+    "仙台市": ("宮城県", ("青葉区", "宮城野区", "若林区", "太白区", "泉区")),
+    "さいたま市": ("埼玉県", ("西区", "北区", "大宮区", "見沼区", "中央区", "桜区", "浦和区", "南区", "緑区", "岩槻区")),
+    "千葉市": ("千葉県", ("中央区", "花見川区", "稲毛区", "若葉区", "緑区", "美浜区")),
+    "横浜市": ("神奈川県", ("鶴見区", "神奈川区", "西区", "中区", "南区", "保土ケ谷区", "保土ヶ谷区", "磯子区", "金沢区",
+                        "港北区", "戸塚区", "港南区", "旭区", "緑区", "瀬谷区", "栄区", "泉区", "青葉区", "都筑区")),
+    "川崎市": ("神奈川県", ("川崎区", "幸区", "中原区", "高津区", "多摩区", "宮前区", "麻生区")),
+    "相模原市": ("神奈川県", ("緑区", "中央区", "南区")),
+    "新潟市": ("新潟県", ("北区", "東区", "中央区", "江南区", "秋葉区", "南区", "西区", "西蒲区")),
+    "静岡市": ("静岡県", ("葵区", "駿河区", "清水区")),
+    # 2024年に再編される前の区名も古い表記のページのために残す
+    "浜松市": ("静岡県", ("中央区", "浜名区", "天竜区", "中区", "東区", "西区", "南区", "北区", "浜北区")),
+    "名古屋市": ("愛知県", ("千種区", "東区", "北区", "西区", "中村区", "中区", "昭和区", "瑞穂区", "熱田区",
+                        "中川区", "港区", "南区", "守山区", "緑区", "名東区", "天白区")),
+    "京都市": ("京都府", ("北区", "上京区", "左京区", "中京区", "東山区", "下京区", "南区", "右京区", "伏見区",
+                      "山科区", "西京区")),
+    "大阪市": ("大阪府", ("都島区", "福島区", "此花区", "西区", "港区", "大正区", "天王寺区", "浪速区", "西淀川区",
+                      "東淀川区", "東成区", "生野区", "旭区", "城東区", "阿倍野区", "住吉区", "東住吉区", "西成区",
+                      "淀川区", "鶴見区", "住之江区", "平野区", "北区", "中央区")),
+    "堺市": ("大阪府", ("堺区", "中区", "東区", "西区", "南区", "北区", "美原区")),
+    "神戸市": ("兵庫県", ("東灘区", "灘区", "兵庫区", "長田区", "須磨区", "垂水区", "北区", "中央区", "西区")),
+    "岡山市": ("岡山県", ("北区", "中区", "東区", "南区")),
+    "広島市": ("広島県", ("中区", "東区", "南区", "西区", "安佐南区", "安佐北区", "安芸区", "佐伯区")),
+    "北九州市": ("福岡県", ("門司区", "若松区", "戸畑区", "小倉北区", "小倉南区", "八幡東区", "八幡西区")),
+    "福岡市": ("福岡県", ("東区", "博多区", "中央区", "南区", "西区", "城南区", "早良区")),
+    "熊本市": ("熊本県", ("中央区", "東区", "西区", "南区", "北区")),
+}
+
+# 区の名前の最大の長さ（「〇〇区」の確認で遡る文字数）
+MAX_WARD_LENGTH = 5
+
+TOKYO_WARDS = (
+    "千代田区", "中央区", "港区", "新宿区", "文京区", "台東区", "墨田区", "江東区", "品川区", "目黒区", "大田区",
+    "世田谷区", "渋谷区", "中野区", "杉並区", "豊島区", "北区", "荒川区", "板橋区", "練馬区", "足立区", "葛飾区",
+    "江戸川区",
+)
+
+# 名前の途中に市・町・村・郡の字を含む市町村と郡（先頭から最短で区切ると途中で切れてしまうもの）
+IRREGULAR_MUNICIPALITIES = (
+    "四日市市", "廿日市市", "野々市市", "十日町市", "大町市", "村山市", "東村山市", "武蔵村山市", "羽村市",
+    "大村市", "田村市", "大和郡山市", "玉村町", "上市町", "下市町", "余市町", "大町町",
+)
+IRREGULAR_DISTRICTS = ("余市郡", "北村山郡", "西村山郡", "東村山郡", "田村郡")
+
+
+class Trie:
+    """文字ごとの辞書を入れ子にしたトライ木（値は語の終わりの節に持つ）"""
+
+    _END = None
+
+    def __init__(self, items=()):
+        self.root = {}
+        for word, value in items:
+            self.add(word, value)
+
+    def add(self, word, value=True):
+        node = self.root
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[self._END] = value
+
+    def longest(self, text, pos=0):
+        """text[pos:] の先頭に一致する最も長い語の (終わりの位置, 値)（なければ None）"""
+        node = self.root
+        found = None
+        for i in range(pos, len(text)):
+            node = node.get(text[i])
+            if node is None:
+                break
+            if self._END in node:
+                found = (i + 1, node[self._END])
+        return found
+
+    def pattern(self):
+        """登録した語のどれかに一致する正規表現（共通の接頭辞はまとめ、長い語を優先する）"""
+        return _node_pattern(self.root)
+
+
+def _node_pattern(node):
+    branches = [re.escape(ch) + _node_pattern(child) for ch, child in sorted(
+        (item for item in node.items() if item[0] is not Trie._END))]
+    if not branches:
+        return ""
+    if Trie._END in node:
+        # 続きがあれば長いほうを先に試す
+        return "(?:" + "|".join(branches) + ")?"
+    if len(branches) == 1:
+        return branches[0]
+    return "(?:" + "|".join(branches) + ")"
+
+
+def alternation(words):
+    """語の選択肢を1つのグループにした正規表現 "(語1|語2|...)"（長い語を先に並べる）"""
+    return "(" + "|".join(re.escape(w) for w in sorted(set(words), key=lambda w: (-len(w), w))) + ")"
+
+
+class Gazetteer:
+    """地名の索引
+
+    値はどれも (都道府県, 市, 区) で、わからない部分は空文字。区だけの語（「中央区」など）は
+    区を持つ都道府県が複数ありうるので、都道府県の候補は ward_prefectures で引く。
+    """
+
+    def __init__(self, prefectures=PREFECTURES, designated_cities=DESIGNATED_CITIES, tokyo_wards=TOKYO_WARDS):
+        self.prefectures = tuple(prefectures)
+        self.trie = Trie()
+        self.city_wards = []
+        self.ward_prefectures = {}
+        for pref in self.prefectures:
+            self.trie.add(pref, (pref, "", ""))
+        for city, (pref, wards) in designated_cities.items():
+            self.trie.add(city, (pref, city, ""))
+            for ward in wards:
+                self.trie.add(city + ward, (pref, city, ward))
+                self.city_wards.append(city + ward)
+                self.ward_prefectures.setdefault(ward, set()).add(pref)
+        for ward in tokyo_wards:
+            self.ward_prefectures.setdefault(ward, set()).add("東京都")
+        for ward in self.ward_prefectures:
+            if ward not in tokyo_wards:
+                self.trie.add(ward, ("", "", ward))
+        for ward in tokyo_wards:
+            # 東京にしかない区は市と同じ扱い（都道府県が省かれていても東京都とわかる）
+            if len(self.ward_prefectures[ward]) == 1:
+                self.trie.add(ward, ("東京都", ward, ward))
+            else:
+                self.trie.add(ward, ("", "", ward))
+        self.wards = tuple(self.ward_prefectures)
+        self._regex = re.compile(self.trie.pattern())
+        self.irregular = Trie([(name, "市町村") for name in IRREGULAR_MUNICIPALITIES]
+                              + [(name, "郡") for name in IRREGULAR_DISTRICTS])
+
+    def lookup(self, text, pos=0):
+        """text[pos:] の先頭にある最も長い地名の (終わりの位置, (都道府県, 市, 区))（なければ None）"""
+        return self.trie.longest(text, pos)
+
+    def finditer(self, text, pos=0, endpos=None):
+        """地名の出現を (開始, 終わり, (都道府県, 市, 区)) で前から順に返す（重なりも返す）"""
+        if endpos is None:
+            endpos = len(text)
+        regex = self._regex
+        while True:
+            m = regex.search(text, pos, endpos)
+            if not m:
+                return
+            yield m.start(), m.end(), self.trie.longest(text, m.start())[1]
+            pos = m.start() + 1
+
+    def place_prefectures(self, place):
+        """地名がありうる都道府県の集合"""
+        pref, city, ward = place
+        if pref:
+            return {pref}
+        return self.ward_prefectures.get(ward, set())
+
+    def is_consistent(self, address):
+        """住所の先頭の都道府県と、そのすぐ後に続く市・区が食い違っていないか
+
+        「神奈川県札幌市」「東京都東京都」のような組み合わせや、区があるはずのない都道府県の
+        「〇〇区」（「千葉県の各地区」など）は住所ではないとみなす。
+        先頭が都道府県でなければ何も確かめない（True）。
+        """
+        head = self.lookup(address)
+        if head is None:
+            return True
+        end, (pref, city, ward) = head
+        if city or ward:
+            return True
+        while end < len(address) and address[end] in " 　":
+            end += 1
+        following = self.lookup(address, end)
+        if following is not None:
+            return pref in self.place_prefectures(following[1]) and following[1] != (pref, "", "")
+        m = _MUNICIPALITY.match(address, end)
+        if m and m.group(1) == "区":
+            # 区は東京23区と政令指定都市にしかないので、辞書にある区で終わっていなければ住所ではない
+            return any(pref in self.ward_prefectures.get(address[i:m.end()], ())
+                       for i in range(max(end, m.end() - MAX_WARD_LENGTH), m.end() - 1))
+        return True
+
+    def _municipality_end(self, text, pos):
+        # 政令指定都市（と区）・東京の区は辞書で、それ以外は「〇〇郡」「〇〇市・町・村」の形で区切る
+        found = self.lookup(text, pos)
+        if found is not None and (found[1][1] or found[1][2]):
+            return found[0]
+        found = self.irregular.longest(text, pos)
+        if found is None:
+            district = _DISTRICT.match(text, pos)
+            if district:
+                pos = district.end()
+                found = self.irregular.longest(text, pos)
+        elif found[1] == "郡":
+            pos = found[0]
+            found = self.irregular.longest(text, pos)
+        if found is not None:
+            return found[0]
+        m = _MUNICIPALITY_NAME.match(text, pos)
+        return m.end() if m else None
+
+    def split(self, address):
+        """住所を (都道府県, 市区町村, それ以降) に分ける
+
+        都道府県が省かれていても、政令指定都市や東京にしかない区なら都道府県を補う。
+        市区町村が見つからなければ、都道府県より後をすべて「それ以降」にする。
+        """
+        pref = ""
+        pos = 0
+        head = self.lookup(address)
+        if head is not None and not head[1][1] and not head[1][2]:
+            pref, pos = head[1][0], head[0]
+            while pos < len(address) and address[pos] in " 　":
+                pos += 1
+        end = self._municipality_end(address, pos)
+        if end is None:
+            return pref, "", address[pos:].strip()
+        if not pref:
+            place = self.lookup(address, pos)
+            if place is not None and place[0] == end:
+                prefectures = self.place_prefectures(place[1])
+                if len(prefectures) == 1:
+                    pref = next(iter(prefectures))
+        return pref, address[pos:end], address[end:].strip()
+
+
+GAZETTEER = Gazetteer()
+
+# 住所パターンの先頭に置く地名の選択肢（AddressMatcher はこの位置だけを照合の起点にする）
+PREFECTURES_RE = alternation(PREFECTURES)
+# 都道府県の後の市区町村（郡も含めて短い範囲だけを見る。「東京都・大阪府・名古屋市」のような列挙は除く）
+MUNICIPALITY_RE = r"[^\n、,。・/／]{0,12}?(市|区|町|村)"
+_MUNICIPALITY = re.compile(MUNICIPALITY_RE)
+# 住所を分けるときの郡と市区町村の名前（1文字目は市・町・村の字でもよい）
+_DISTRICT = re.compile(r"[^\s\d、,。・/／]{1,6}?郡")
+_MUNICIPALITY_NAME = re.compile(r"[^\s\d、,。・/／]{1,8}?[市区町村]")
+CITY_WARDS_RE = alternation(GAZETTEER.city_wards)
+WARDS_RE = alternation(GAZETTEER.wards)
+# 住所パターンの先頭に置く選択肢 → その語の一覧（AddressMatcher が照合の起点と前段フィルタに使う）
+ANCHORS = {
+    PREFECTURES_RE: PREFECTURES,
+    CITY_WARDS_RE: GAZETTEER.city_wards,
+    WARDS_RE: GAZETTEER.wards,
+}
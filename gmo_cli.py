@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+会社情報抽出のコマンドライン版（Streamlit なしでバッチ実行する）
+
+例:
+    python gmo_cli.py urls.txt -o result.csv
+    python gmo_cli.py urls.txt --all-addresses -o branches.csv   # 本社・支店などの住所をすべて1件1行で
+    cat urls.txt | python gmo_cli.py --extractor full --format jsonl > result.jsonl
+"""
+
+import argparse
+import csv
+import importlib.util
+import json
+import os
+import sys
+import unicodedata
+
+import address_list
+import fetch_engine
+import http_session
+import metrics
+import parse_pool
+from extractors import job_name
+from job_store import JobStore, is_error, run_job
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# 抽出器の名前 → (スクリプトのファイル名, モジュール名)
+EXTRACTORS = {
+    "address": ("GMO.py", "GMO"),
+    "full": ("GMOのコピー.py", "GMO_copy"),
+}
+
+
+def _find_script(filename):
+    # macOS で作られたファイル名は濁点・半濁点が分解された形（NFD）のことがあるので正規化して探す
+    target = unicodedata.normalize("NFC", filename)
+    for entry in os.listdir(HERE):
+        if unicodedata.normalize("NFC", entry) == target:
+            return os.path.join(HERE, entry)
+    raise FileNotFoundError(filename)
+
+
+def load_extractor(name):
+    """抽出器のスクリプトをモジュールとして読み込む（画面は表示されない）"""
+    filename, module_name = EXTRACTORS[name]
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    spec = importlib.util.spec_from_file_location(module_name, _find_script(filename))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def read_urls(stream):
+    """1行1URL（空行と # で始まる行は無視）"""
+    for line in stream:
+        url = line.strip()
+        if url and not url.startswith("#"):
+            yield url
+
+
+class CsvWriter:
+    def __init__(self, stream, fields):
+        self.writer = csv.DictWriter(stream, fieldnames=fields + ["エラー"], extrasaction="ignore")
+        self.writer.writeheader()
+
+    def write(self, row):
+        self.writer.writerow(row)
+
+
+class JsonlWriter:
+    def __init__(self, stream, fields):
+        self.stream = stream
+
+    def write(self, row):
+        self.stream.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+
+WRITERS = {"csv": CsvWriter, "jsonl": JsonlWriter}
+
+
+def write_result(writer, url, result):
+    """1件の結果を書き出す（行のリストならそれぞれを1行ずつ）"""
+    for item in address_list.as_rows(result):
+        row = {"URL": url}
+        row.update(item)
+        writer.write(row)
+
+
+def run(urls, extractor, writer, out, max_workers, per_host, func=None):
+    """抽出を並列に実行し、終わったものから書き出す。URLの件数とエラー件数を返す
+
+    func（省略時は get_company_info）が行のリストを返すときは、それぞれを1行ずつ書き出す。
+    """
+    if func is None:
+        func = extractor.get_company_info
+    total = errors = 0
+    for _, url, result in fetch_engine.iter_fetch(urls, func, max_workers, per_host):
+        write_result(writer, url, result)
+        out.flush()
+        total += 1
+        if is_error(result):
+            errors += 1
+    return total, errors
+
+
+def write_items(path, fmt, fields, items):
+    """チェックポイントの (URL, 結果) から出力全体を書く（ファイルは書き終えてから置き換える）"""
+    if path == "-":
+        writer = WRITERS[fmt](sys.stdout, fields)
+        for url, result in items:
+            write_result(writer, url, result)
+        sys.stdout.flush()
+        return
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8", newline="") as f:
+        writer = WRITERS[fmt](f, fields)
+        for url, result in items:
+            write_result(writer, url, result)
+    os.replace(tmp, path)
+
+
+def resume(urls, name, func, max_workers, per_host, path, fmt, fields):
+    """チェックポイントに記録しながら未完了のURLだけを処理し、完了件数とエラー件数を返す
+
+    出力は最後にチェックポイントから入力順に作り直す（やり直したURLの前回のエラー行が残ったり、
+    記録したが書き出す前に落ちたURLが抜けたりしないように）。件数はこれまでの実行の分も含む。
+    """
+    store = JobStore()
+    try:
+        job_id = store.create_job(urls, name)
+        progress = store.progress(job_id)
+        print(f"ジョブ {job_id}: 完了 {progress['done']}件 / 全 {progress['total']}件", file=sys.stderr)
+        try:
+            run_job(store, job_id, func, max_workers, per_host)
+        finally:
+            write_items(path, fmt, fields, store.items(job_id))
+        progress = store.progress(job_id)
+    finally:
+        store.close()
+    return progress["done"] + progress["error"], progress["error"]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="会社のWebサイトから所在地などを抽出します")
+    parser.add_argument("input", nargs="?", default="-", help="URLを1行に1つ書いたファイル（省略時は標準入力）")
+    parser.add_argument("-o", "--output", default="-", help="出力先（省略時は標準出力）")
+    parser.add_argument("-f", "--format", choices=sorted(WRITERS), help="出力形式（省略時は拡張子から判断、既定は csv）")
+    parser.add_argument("-e", "--extractor", choices=sorted(EXTRACTORS), default="address",
+                        help="address: 所在地のみ（GMO.py） / full: 全項目（GMOのコピー.py）")
+    parser.add_argument("-a", "--all-addresses", action="store_true",
+                        help="ページにあるすべての住所（本社・本店・支店・営業所）を1件1行で書き出す")
+    parser.add_argument("-w", "--workers", type=int, default=fetch_engine.MAX_WORKERS, help="同時に取得する数")
+    parser.add_argument("-p", "--parse-workers", type=int, default=parse_pool.WORKERS,
+                        help="HTMLの解析を行うプロセスの数（0なら取得したスレッドで解析する。目安はCPUのコア数）")
+    parser.add_argument("--per-host", type=int, default=fetch_engine.PER_HOST_LIMIT, help="同一ホストへの同時接続数")
+    parser.add_argument("--no-cache", action="store_true", help="HTTPキャッシュを使わない")
+    parser.add_argument("--resume", action="store_true",
+                        help="チェックポイントに記録し、再実行時は完了済みのURLを飛ばして失敗分だけやり直す（出力はチェックポイントから作り直す）")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="工程ごとの時間と住所が取れた方法の件数を書き出す（.prom なら Prometheus 形式、ほかは JSON）")
+    return parser
+
+
+def write_metrics(path, extractor):
+    if path.endswith(".prom"):
+        data = metrics.to_prometheus([extractor.METRICS])
+    else:
+        data = extractor.METRICS.to_json(records=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(data)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    fmt = args.format
+    if fmt is None:
+        fmt = "jsonl" if args.output.endswith((".jsonl", ".ndjson")) else "csv"
+    if args.no_cache:
+        http_session.USE_CACHE = False
+    parse_pool.configure(args.parse_workers)
+
+    extractor = load_extractor(args.extractor)
+    func = extractor.get_all_addresses if args.all_addresses else extractor.get_company_info
+    fields = address_list.FIELDS if args.all_addresses else extractor.FIELDS
+    src = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    try:
+        urls = read_urls(src)
+        if args.resume:
+            # パターンなどを変えたら、同じURLの並びでも前回の結果は使わずに処理し直す
+            name = job_name(args.extractor + ":住所一覧" if args.all_addresses else args.extractor,
+                            extractor.EXTRACTOR_VERSION)
+            total, errors = resume(list(urls), name, func, args.workers, args.per_host, args.output, fmt, fields)
+        else:
+            out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="")
+            try:
+                writer = WRITERS[fmt](out, fields)
+                total, errors = run(urls, extractor, writer, out, args.workers, args.per_host, func)
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+    finally:
+        if src is not sys.stdin:
+            src.close()
+    print(f"完了: {total}件（エラー {errors}件）", file=sys.stderr)
+    if args.metrics:
+        write_metrics(args.metrics, extractor)
+    return 1 if total and errors == total else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTMLパーサーの切り替えと、dt/dd・th/td の行の索引
+"""
+
+import os
+
+from bs4 import BeautifulSoup, NavigableString
+from bs4.dammit import UnicodeDammit
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+try:
+    import lxml  # noqa: F401
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+
+# 使えるもののうち速い順に選ぶ（GMO_HTML_BACKEND で固定もできる）
+BACKENDS = ("selectolax", "lxml", "html.parser")
+# get_text と同じく、本文のテキストに含めない要素
+_NON_TEXT_TAGS = ("script", "style", "template")
+
+
+def available_backends():
+    """この環境で使えるバックエンドの一覧"""
+    found = []
+    if LexborHTMLParser is not None:
+        found.append("selectolax")
+    if HAS_LXML:
+        found.append("lxml")
+    found.append("html.parser")
+    return found
+
+
+def default_backend():
+    forced = os.environ.get("GMO_HTML_BACKEND")
+    if forced:
+        if forced not in available_backends():
+            raise ValueError(f"HTMLパーサー {forced} は使えません（使えるもの: {', '.join(available_backends())}）")
+        return forced
+    return available_backends()[0]
+
+
+BACKEND = default_backend()
+
+
+def make_soup(content, backend=None):
+    """BeautifulSoup を作る（lxml があれば lxml を使う）"""
+    backend = backend or BACKEND
+    return BeautifulSoup(content, "lxml" if backend != "html.parser" and HAS_LXML else "html.parser")
+
+
+class PageIndex:
+    """1ページ分の dt/dd・th/td の行と、キーワードを含むテキストの索引
+
+    dl_rows と table_rows は (見出し, 値) の文書順のリスト、text_blocks はキーワードを含む
+    テキストに親の次の要素のテキストをつないだ候補文字列のリスト、links は <a> の
+    (href, リンクの文字列・画像の alt・title) のリスト。
+    """
+
+    def __init__(self, dl_rows, table_rows, text_blocks, text_func, links=()):
+        self.dl_rows = dl_rows
+        self.table_rows = table_rows
+        self.text_blocks = text_blocks
+        self.links = links
+        self._text_func = text_func
+        self._text = None
+
+    @property
+    def text(self):
+        """soup.get_text(separator="\\n", strip=True) 相当のページ全体のテキスト"""
+        if self._text is None:
+            self._text = self._text_func()
+        return self._text
+
+    @property
+    def lines(self):
+        return self.text.split("\n")
+
+    def materialize(self):
+        """遅れて作る本文のテキストをいま作る（解析の工程の時間に含めたいときに呼ぶ）"""
+        if self._text is None:
+            self._text = self._text_func()
+        return self
+
+
+def _text_block(text, next_text):
+    candidate = text
+    if next_text is not None:
+        candidate += " " + next_text
+    return candidate.replace('\n', ' ').replace('\r', ' ')
+
+
+def _link_label(text, alts, title):
+    return " ".join(part for part in (text, *alts, title) if part)
+
+
+def index_soup(soup, text_keywords=()):
+    """BeautifulSoup の木を1回たどって索引を作る"""
+    dl_rows = []
+    table_rows = []
+    text_blocks = []
+    links = []
+    for node in soup.descendants:
+        if isinstance(node, NavigableString):
+            if text_keywords and any(k in node for k in text_keywords):
+                next_sibling = node.parent.find_next_sibling() if node.parent else None
+                next_text = next_sibling.get_text(separator=" ", strip=True) if next_sibling else None
+                text_blocks.append(_text_block(str(node), next_text))
+        elif node.name == "dt":
+            dd = node.find_next_sibling("dd")
+            if dd:
+                dl_rows.append((node.get_text(strip=True), dd.get_text(separator=" ", strip=True)))
+        elif node.name == "tr":
+            th = node.find("th")
+            td = node.find("td")
+            if th and td:
+                table_rows.append((th.get_text(strip=True), td.get_text(separator=" ", strip=True)))
+        elif node.name == "a":
+            href = node.get("href")
+            if href:
+                alts = [img.get("alt", "") for img in node.find_all("img")]
+                links.append((href.strip(), _link_label(node.get_text(separator=" ", strip=True),
+                                                        alts, node.get("title", ""))))
+    return PageIndex(dl_rows, table_rows, text_blocks,
+                     lambda: soup.get_text(separator="\n", strip=True), links)
+
+
+def _lexbor_text(node, separator):
+    # get_text(separator, strip=True) と同じく、空でないテキストだけを strip してつなぐ
+    parts = []
+    for n in node.traverse(include_text=True):
+        if n.tag == "-text":
+            parent = n.parent
+            if parent is not None and parent.tag in _NON_TEXT_TAGS:
+                continue
+            piece = n.text_content.strip()
+            if piece:
+                parts.append(piece)
+    return separator.join(parts)
+
+
+def _next_element(node):
+    node = node.next
+    while node is not None and node.tag.startswith(("-", "_")):
+        node = node.next
+    return node
+
+
+def index_lexbor(tree, text_keywords=()):
+    """selectolax (lexbor) の木を1回たどって索引を作る"""
+    dl_rows = []
+    table_rows = []
+    text_blocks = []
+    links = []
+    for node in tree.root.traverse(include_text=True):
+        tag = node.tag
+        if tag == "-text":
+            text = node.text_content
+            if text_keywords and text and any(k in text for k in text_keywords):
+                parent = node.parent
+                next_sibling = _next_element(parent) if parent is not None else None
+                next_text = _lexbor_text(next_sibling, " ") if next_sibling is not None else None
+                text_blocks.append(_text_block(text, next_text))
+        elif tag == "dt":
+            dd = node.next
+            while dd is not None and dd.tag != "dd":
+                dd = dd.next
+            if dd is not None:
+                dl_rows.append((_lexbor_text(node, ""), _lexbor_text(dd, " ")))
+        elif tag == "tr":
+            th = node.css_first("th")
+            td = node.css_first("td")
+            if th is not None and td is not None:
+                table_rows.append((_lexbor_text(th, ""), _lexbor_text(td, " ")))
+        elif tag == "a":
+            href = node.attributes.get("href")
+            if href:
+                alts = [img.attributes.get("alt") or "" for img in node.css("img")]
+                links.append((href.strip(), _link_label(_lexbor_text(node, " "), alts,
+                                                        node.attributes.get("title") or "")))
+    return PageIndex(dl_rows, table_rows, text_blocks,
+                     lambda: _lexbor_text(tree.root, "\n"), links)
+
+
+def parse_page(content, text_keywords=(), backend=None):
+    """本文を解析して PageIndex を返す"""
+    backend = backend or BACKEND
+    if backend == "selectolax":
+        # lexbor は文字コードを判定しないので、BeautifulSoup と同じ方法で先にデコードする
+        markup = UnicodeDammit(content, is_html=True).unicode_markup if isinstance(content, bytes) else content
+        return index_lexbor(LexborHTMLParser(markup or ""), text_keywords)
+    return index_soup(make_soup(content, backend), text_keywords)
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+共有HTTPセッション（コネクションプール・リトライ付き）
+"""
+
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from response_cache import ResponseCache, cached_get
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8',
+    'Accept-Language': 'ja,en-US;q=0.9,en;q=0.8',
+    'Connection': 'keep-alive',
+    'Cache-Control': 'max-age=0',
+}
+
+TIMEOUT = 10
+# プールしておくホスト数と、1ホストあたりの保持コネクション数
+POOL_CONNECTIONS = 64
+POOL_MAXSIZE = 4
+# 接続リセットのときのリトライ回数と待ち時間の係数
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.5
+# 429/503 はその場では再試行せず ThrottledError にする（politeness のスケジューラが待ち行列に戻す）
+RETRY_STATUS = (429, 503)
+STATUS_RETRIES = 0
+# 本文を読み込む上限（超えた分は読まずに打ち切る）と、1回に読むサイズ
+MAX_BYTES = 5 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+# 本文を読む Content-Type（ヘッダーがなければ読む）
+ALLOWED_CONTENT_TYPES = ("text/html", "application/xhtml+xml", "application/xml", "text/xml", "text/plain")
+
+# ディスクキャッシュを使うかどうか（False なら毎回取得する）
+USE_CACHE = True
+
+_session = None
+_cache = None
+_lock = threading.Lock()
+# 実際に通信したレスポンスごとに observer(url, status, 応答までの秒数) を呼ぶ
+_observers = []
+
+
+class ThrottledError(Exception):
+    """429/503 でアクセスを制限された"""
+
+    def __init__(self, url, status, retry_after=None):
+        super().__init__(f"アクセスが制限されました: HTTP {status}")
+        self.url = url
+        self.status = status
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value):
+    """Retry-After ヘッダー（秒数または日時）を秒数にする"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def add_observer(func):
+    _observers.append(func)
+
+
+def remove_observer(func):
+    if func in _observers:
+        _observers.remove(func)
+
+
+def create_session(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE,
+                   max_retries=MAX_RETRIES, backoff_factor=BACKOFF_FACTOR,
+                   status_retries=STATUS_RETRIES):
+    """プールとリトライを設定したセッションを作る"""
+    retry = Retry(
+        total=max_retries,
+        connect=max_retries,
+        read=max_retries,
+        status=status_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUS,
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                          max_retries=retry)
+    session = requests.Session()
+    session.headers.update(DEFAULT_HEADERS)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session():
+    """プロセス内で共有するセッションを返す"""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = create_session()
+    return _session
+
+
+def configure(**kwargs):
+    """共有セッションを設定し直す（引数は create_session と同じ）"""
+    global _session
+    with _lock:
+        old, _session = _session, create_session(**kwargs)
+    if old is not None:
+        old.close()
+
+
+def get_cache():
+    """プロセス内で共有するレスポンスキャッシュを返す"""
+    global _cache
+    if _cache is None:
+        with _lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
+
+
+def check_content_type(res):
+    """HTML以外の本文なら ValueError を投げる"""
+    content_type = res.headers.get("Content-Type", "")
+    mime = content_type.split(";")[0].strip().lower()
+    if mime and mime not in ALLOWED_CONTENT_TYPES:
+        raise ValueError(f"HTML以外のコンテンツです: {mime}")
+
+
+def read_body(res, max_bytes=MAX_BYTES, on_chunk=None):
+    """本文を上限まで読む
+
+    on_chunk(chunk) が真を返したらそこで読むのをやめる（res.partial が True になる）。
+    上限で打ち切った場合は res.truncated が True になる。
+    """
+    chunks = []
+    size = 0
+    res.partial = False
+    res.truncated = False
+    for chunk in res.iter_content(CHUNK_SIZE):
+        if size + len(chunk) > max_bytes:
+            chunk = chunk[:max_bytes - size]
+            res.truncated = True
+        chunks.append(chunk)
+        size += len(chunk)
+        if on_chunk is not None and on_chunk(chunk):
+            res.partial = True
+            break
+        if res.truncated:
+            break
+    res._content = b"".join(chunks)
+    res._content_consumed = True
+    return res
+
+
+def _send(url, headers, timeout, max_bytes, on_chunk):
+    res = get_session().get(url, headers=headers, timeout=timeout, stream=True)
+    for observer in list(_observers):
+        observer(url, res.status_code, res.elapsed.total_seconds())
+    if res.status_code in RETRY_STATUS:
+        res.close()
+        raise ThrottledError(url, res.status_code, parse_retry_after(res.headers.get("Retry-After")))
+    try:
+        if res.status_code == 200:
+            check_content_type(res)
+        read_body(res, max_bytes, on_chunk)
+    finally:
+        res.close()
+    return res
+
+
+def fetch(url, timeout=TIMEOUT, use_cache=None, max_bytes=MAX_BYTES, on_chunk=None):
+    """共有セッションで URL を取得する
+
+    本文はストリーミングで max_bytes まで読む。on_chunk を渡すと読んだ断片ごとに呼ばれ、
+    真を返した時点でダウンロードをやめる（キャッシュから返すときは本文全体で1回呼ばれる）。
+    """
+    if use_cache is None:
+        use_cache = USE_CACHE
+
+    def send(extra_headers):
+        headers = {'Referer': url}
+        headers.update(extra_headers)
+        return _send(url, headers, timeout, max_bytes, on_chunk)
+
+    if not use_cache:
+        return send({})
+    res = cached_get(get_cache(), url, send, allow_partial=on_chunk is not None)
+    if res.from_cache and on_chunk is not None:
+        on_chunk(res.content)
+    return res
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+バッチ処理のチェックポイント（途中で落ちても完了分から再開する）
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from fetch_engine import MAX_WORKERS, PER_HOST_LIMIT, iter_fetch
+
+JOB_DB_PATH = os.environ.get("GMO_JOB_DB", os.path.join(".gmo_cache", "jobs.sqlite3"))
+
+PENDING = "pending"
+DONE = "done"
+ERROR = "error"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    extractor TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_urls (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE INDEX IF NOT EXISTS job_urls_status ON job_urls (job_id, status);
+"""
+
+
+def job_id_for(urls, extractor):
+    """抽出器とURLの並びからジョブIDを作る（同じバッチなら同じID）"""
+    h = hashlib.sha1(extractor.encode("utf-8"))
+    for url in urls:
+        h.update(b"\n" + url.encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def is_error(result):
+    # 住所一覧のモードでは結果が行のリストになる（エラーのときだけ辞書）
+    return isinstance(result, dict) and "エラー" in result
+
+
+class JobStore:
+    """ジョブとURLごとの結果を SQLite に保存する"""
+
+    def __init__(self, path=JOB_DB_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def create_job(self, urls, extractor):
+        """ジョブを登録してIDを返す（同じバッチが登録済みならそのIDを返す）"""
+        urls = list(urls)
+        job_id = job_id_for(urls, extractor)
+        with self._conn:
+            # 別の接続が同じバッチを同時に登録しても、URLの行を入れるのは jobs の行を入れたほうだけ
+            added = self._conn.execute("INSERT OR IGNORE INTO jobs VALUES (?, ?, ?, ?)",
+                                       (job_id, extractor, len(urls), time.time())).rowcount
+            if added:
+                self._conn.executemany(
+                    "INSERT INTO job_urls (job_id, idx, url, status) VALUES (?, ?, ?, ?)",
+                    ((job_id, i, url, PENDING) for i, url in enumerate(urls)),
+                )
+        return job_id
+
+    def pending(self, job_id, retry_errors=True):
+        """まだ終わっていない (番号, URL) の一覧（retry_errors ならエラーのものも含める）"""
+        statuses = (PENDING, ERROR) if retry_errors else (PENDING,)
+        return self._conn.execute(
+            f"SELECT idx, url FROM job_urls WHERE job_id = ? AND status IN ({','.join('?' * len(statuses))}) ORDER BY idx",
+            (job_id, *statuses),
+        ).fetchall()
+
+    def record(self, job_id, idx, result):
+        """1件の結果を書き込む（すぐにコミットする）"""
+        with self._conn:
+            self._conn.execute(
+                "UPDATE job_urls SET status = ?, result = ?, attempts = attempts + 1, updated_at = ? "
+                "WHERE job_id = ? AND idx = ?",
+                (ERROR if is_error(result) else DONE, json.dumps(result, ensure_ascii=False),
+                 time.time(), job_id, idx),
+            )
+
+    def progress(self, job_id):
+        """{"total", "done", "error", "pending"} の件数"""
+        counts = {PENDING: 0, DONE: 0, ERROR: 0}
+        for status, n in self._conn.execute(
+                "SELECT status, COUNT(*) FROM job_urls WHERE job_id = ? GROUP BY status", (job_id,)):
+            counts[status] = n
+        counts["total"] = sum(counts.values())
+        return counts
+
+    def results(self, job_id):
+        """完了した結果を入力順で返す（未処理のURLは含めない）"""
+        return [result for _, result in self.items(job_id)]
+
+    def items(self, job_id):
+        """完了した (URL, 結果) を入力順で返す（未処理のURLは含めない）"""
+        rows = self._conn.execute(
+            "SELECT url, result FROM job_urls WHERE job_id = ? AND status != ? ORDER BY idx", (job_id, PENDING))
+        return [(url, json.loads(result)) for url, result in rows]
+
+    def reset(self, job_id):
+        """ジョブの結果を捨てて最初からやり直せるようにする"""
+        with self._conn:
+            self._conn.execute(
+                "UPDATE job_urls SET status = ?, result = NULL, attempts = 0, updated_at = NULL WHERE job_id = ?",
+                (PENDING, job_id),
+            )
+
+    def close(self):
+        self._conn.close()
+
+
+def run_job(store, job_id, func, max_workers=MAX_WORKERS, per_host=PER_HOST_LIMIT,
+            retry_errors=True, on_result=None, cancel=None):
+    """未完了のURLだけを処理し、1件終わるごとにチェックポイントへ書き込む
+
+    on_result(url, result) は書き込みのたびに呼ばれる。cancel（threading.Event）がセットされたら
+    途中で終わる（終わっていないURLは未完了のまま残るので、あとで続きから処理できる）。
+    """
+    todo = store.pending(job_id, retry_errors)
+    for i, url, result in iter_fetch([url for _, url in todo], func, max_workers, per_host, cancel=cancel):
+        store.record(job_id, todo[i][0], result)
+        if on_result is not None:
+            on_result(url, result)
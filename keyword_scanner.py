@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+KEYWORDS の全カテゴリを1回の走査でまとめて照合する
+
+キーワードの近くで値が取れなかったときに本文全体から探す項目ごとのパターンも、
+目印の文字を1回走査してまとめて照合する（FallbackScanner）。
+"""
+
+import re
+from bisect import bisect_right
+
+from gazetteer import Trie
+
+
+class KeywordScanner:
+    """カテゴリ → キーワード一覧の辞書から、全キーワードを一度に探す照合器を作る"""
+
+    def __init__(self, keywords):
+        self.keywords = {cat: list(words) for cat, words in keywords.items()}
+        owners = {}
+        for cat, words in self.keywords.items():
+            for word in words:
+                owners.setdefault(word, set()).add(cat)
+        # 同じ位置から始まる短いキーワードは長いほうに隠れるので、
+        # 各キーワードに「自身に含まれるキーワードのカテゴリ」もまとめて持たせる
+        self._categories = {}
+        for word in owners:
+            cats = set()
+            for other, other_cats in owners.items():
+                if other in word:
+                    cats |= other_cats
+            self._categories[word] = frozenset(cats)
+        # 全キーワードを共通の接頭辞でまとめたトライ木の正規表現にする（各位置で試す分岐が
+        # キーワードの数に比例しないように）。一致するのは各位置で最も長いキーワード。
+        # 先読みにして、重なり合う出現もすべての開始位置で拾う
+        self._regex = re.compile(f"(?=({Trie((w, True) for w in owners).pattern()}))")
+        # 値を取り出すときにキーワードを取り除くパターン（キーワードをそのまま '|' でつないだもの）
+        self._removers = {cat: re.compile("|".join(words)) for cat, words in self.keywords.items()}
+
+    def scan(self, text):
+        """テキスト（改行区切り）を1回走査し、カテゴリごとのヒット行を持つ KeywordHits を返す"""
+        lines = text.split("\n")
+        starts = [0]
+        for line in lines[:-1]:
+            starts.append(starts[-1] + len(line) + 1)
+        hits = {cat: [] for cat in self.keywords}
+        for m in self._regex.finditer(text):
+            i = bisect_right(starts, m.start()) - 1
+            for cat in self._categories[m.group(1)]:
+                rows = hits[cat]
+                if not rows or rows[-1] != i:
+                    rows.append(i)
+        return KeywordHits(self, lines, hits)
+
+    def strip_keywords(self, category, text):
+        """テキストからカテゴリのキーワードを取り除く"""
+        return self._removers[category].sub('', text)
+
+
+class KeywordHits:
+    """1ページ分の走査結果"""
+
+    def __init__(self, scanner, lines, hits):
+        self.scanner = scanner
+        self.lines = lines
+        self.hits = hits
+        self._hit_sets = {}
+
+    def lines_for(self, category):
+        """キーワードを含む行番号（昇順）"""
+        return self.hits[category]
+
+    def contains(self, category, i):
+        """i 行目がカテゴリのキーワードを含むか"""
+        if category not in self._hit_sets:
+            self._hit_sets[category] = set(self.hits[category])
+        return i in self._hit_sets[category]
+
+    def extract(self, category, value_pattern=None, after_line=0):
+        """カテゴリのキーワードを含む行（とその後の after_line 行）から値を返す（ヒット行だけを見る）
+
+        value_pattern があればそれに一致した部分、なければキーワードを取り除いた行の残り。
+        """
+        lines = self.lines
+        value_re = re.compile(value_pattern) if value_pattern else None
+        for i in self.hits[category]:
+            for offset in range(after_line + 1):
+                idx = i + offset
+                if idx < len(lines):
+                    target = lines[idx]
+                    if value_re:
+                        m = value_re.search(target)
+                        if m:
+                            return m.group().strip()
+                    else:
+                        val = self.scanner.strip_keywords(category, target).strip(' :：')
+                        if val:
+                            return val
+        return ""
+
+
+class FallbackScanner:
+    """項目 → (パターン, 目印の文字, 遡る文字数) の辞書から、各パターンの最初のマッチを1回の走査で探す
+
+    どのパターンのマッチも、開始位置から「遡る文字数」以内に目印の文字のどれかを含むこと
+    （「〒123-4567」の郵便番号なら目印は「-」で、遡るのは4文字）。本文は目印の文字だけを探し、
+    見つかった位置の手前からそのパターンを照合するので、数字のように多い文字の位置を全部試すことはない。
+    """
+
+    def __init__(self, patterns):
+        self.patterns = dict(patterns)
+        self._owners = {}
+        for name, (_, anchors, _) in self.patterns.items():
+            for ch in anchors:
+                self._owners.setdefault(ch, []).append(name)
+        self._regex = re.compile("[" + "".join(re.escape(ch) for ch in sorted(self._owners)) + "]")
+
+    def scan(self, text):
+        """項目 → 最初のマッチ（pattern.search(text) と同じもの。なければ None）"""
+        found = dict.fromkeys(self.patterns)
+        missing = len(found)
+        for m in self._regex.finditer(text):
+            if not missing:
+                break
+            end = m.start()
+            for name in self._owners[m.group()]:
+                if found[name] is not None:
+                    continue
+                pattern, _, back = self.patterns[name]
+                # 前の目印で試した位置はもう一致しないので、手前から順に試せば最初のマッチになる
+                for start in range(max(end - back, 0), end + 1):
+                    hit = pattern.match(text, start)
+                    if hit:
+                        found[name] = hit
+                        missing -= 1
+                        break
+        return found
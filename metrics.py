@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+抽出処理の計測（工程ごとの時間と、どの方法で住所が取れたかの件数）
+
+    with METRICS.track(url):
+        with METRICS.phase("fetch"):
+            ...
+        METRICS.set_strategy("dl")
+
+工程の時間は入れ子の分を除いた正味の時間。JSON と Prometheus のテキスト形式で書き出せる。
+"""
+
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# URLごとの記録を保持する件数の上限（古いものから捨てる）
+MAX_RECORDS = 10000
+# 抽出結果のキャッシュから返したとき・どの方法でも取れなかったときの方法の名前
+CACHED = "cached"
+NONE = "none"
+# エラー行を返したとき・例外で抜けたとき（アクセス制限で待ち行列に戻されたときなど）の方法の名前
+ERROR = "error"
+ABORTED = "aborted"
+PROMETHEUS_PREFIX = "gmo_extract"
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+class Metrics:
+    """1つの抽出器の計測値"""
+
+    def __init__(self, name, max_records=MAX_RECORDS):
+        self.name = name
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.records = deque(maxlen=max_records)
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.urls = 0
+            self.errors = 0
+            self.total_seconds = 0.0
+            self.phase_seconds = {}
+            self.phase_counts = {}
+            self.strategies = {}
+            self.records.clear()
+
+    @contextmanager
+    def track(self, url):
+        """1URL分の記録を始める（入れ子で呼ばれたときは外側の記録に足す）"""
+        if getattr(self._local, "record", None) is not None:
+            yield self._local.record
+            return
+        record = {"url": url, "phases": {}, "strategy": None, "error": False}
+        self._local.record = record
+        self._local.stack = []
+        start = time.perf_counter()
+        try:
+            yield record
+        except Exception:
+            record["strategy"] = ABORTED
+            raise
+        finally:
+            record["seconds"] = time.perf_counter() - start
+            record["strategy"] = record["strategy"] or NONE
+            self._local.record = None
+            with self._lock:
+                self.urls += 1
+                self.errors += record["error"]
+                self.total_seconds += record["seconds"]
+                self.strategies[record["strategy"]] = self.strategies.get(record["strategy"], 0) + 1
+                self.records.append(record)
+
+    @contextmanager
+    def phase(self, name):
+        """工程の時間を計る（track の外で呼ばれたときは全体の集計にだけ足す）"""
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            own = elapsed - stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            record = getattr(self._local, "record", None)
+            if record is not None:
+                record["phases"][name] = record["phases"].get(name, 0.0) + own
+            with self._lock:
+                self.phase_seconds[name] = self.phase_seconds.get(name, 0.0) + own
+                self.phase_counts[name] = self.phase_counts.get(name, 0) + 1
+
+    def merge(self, record):
+        """別プロセスで計測した1URL分の記録（工程の時間と方法）を、いま処理中のURLに足す
+
+        足した時間は外側の工程の正味の時間からは除く。
+        """
+        phases = record["phases"]
+        stack = getattr(self._local, "stack", None)
+        if stack:
+            stack[-1] += sum(phases.values())
+        current = getattr(self._local, "record", None)
+        if current is not None:
+            for name, seconds in phases.items():
+                current["phases"][name] = current["phases"].get(name, 0.0) + seconds
+            if record["strategy"]:
+                current["strategy"] = record["strategy"]
+        with self._lock:
+            for name, seconds in phases.items():
+                self.phase_seconds[name] = self.phase_seconds.get(name, 0.0) + seconds
+                self.phase_counts[name] = self.phase_counts.get(name, 0) + 1
+
+    def set_strategy(self, strategy):
+        """いま処理中のURLで住所が取れた方法を記録する（後から呼ばれたものが優先）"""
+        record = getattr(self._local, "record", None)
+        if record is not None:
+            record["strategy"] = strategy
+
+    def get_strategy(self):
+        record = getattr(self._local, "record", None)
+        return record["strategy"] if record is not None else None
+
+    def mark_error(self):
+        """例外にせずエラー行を返したときに呼ぶ"""
+        record = getattr(self._local, "record", None)
+        if record is not None:
+            record["error"] = True
+            record["strategy"] = ERROR
+
+    def summary(self):
+        """集計値の辞書（JSON にそのまま書ける）"""
+        with self._lock:
+            return {
+                "extractor": self.name,
+                "urls": self.urls,
+                "errors": self.errors,
+                "seconds": self.total_seconds,
+                "phases": {
+                    name: {
+                        "count": self.phase_counts[name],
+                        "seconds": seconds,
+                        "ms_per_url": seconds * 1000 / self.urls if self.urls else 0.0,
+                    }
+                    for name, seconds in sorted(self.phase_seconds.items(), key=lambda kv: -kv[1])
+                },
+                "strategies": dict(sorted(self.strategies.items(), key=lambda kv: -kv[1])),
+            }
+
+    def to_json(self, records=False):
+        data = self.summary()
+        if records:
+            with self._lock:
+                data["records"] = list(self.records)
+        return json.dumps(data, ensure_ascii=False, indent=2)
+
+
+def get_metrics(name):
+    """抽出器ごとの計測値を返す（なければ作る）"""
+    with _registry_lock:
+        metrics = _registry.get(name)
+        if metrics is None:
+            metrics = _registry[name] = Metrics(name)
+        return metrics
+
+
+def all_metrics():
+    with _registry_lock:
+        return list(_registry.values())
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def to_prometheus(metrics_list=None, prefix=PROMETHEUS_PREFIX):
+    """Prometheus のテキスト形式（exposition format）で書き出す"""
+    if metrics_list is None:
+        metrics_list = all_metrics()
+    lines = [
+        f"# HELP {prefix}_urls_total 処理したURLの数",
+        f"# TYPE {prefix}_urls_total counter",
+    ]
+    summaries = [m.summary() for m in metrics_list]
+    for s in summaries:
+        lines.append(f'{prefix}_urls_total{{extractor="{_label(s["extractor"])}"}} {s["urls"]}')
+    lines += [f"# HELP {prefix}_errors_total エラーになったURLの数", f"# TYPE {prefix}_errors_total counter"]
+    for s in summaries:
+        lines.append(f'{prefix}_errors_total{{extractor="{_label(s["extractor"])}"}} {s["errors"]}')
+    lines += [f"# HELP {prefix}_phase_seconds 工程ごとの正味の処理時間", f"# TYPE {prefix}_phase_seconds summary"]
+    for s in summaries:
+        for name, phase in s["phases"].items():
+            labels = f'extractor="{_label(s["extractor"])}",phase="{_label(name)}"'
+            lines.append(f"{prefix}_phase_seconds_sum{{{labels}}} {phase['seconds']:.6f}")
+            lines.append(f"{prefix}_phase_seconds_count{{{labels}}} {phase['count']}")
+    lines += [f"# HELP {prefix}_strategy_total 住所が取れた方法ごとのURLの数",
+              f"# TYPE {prefix}_strategy_total counter"]
+    for s in summaries:
+        for name, count in s["strategies"].items():
+            labels = f'extractor="{_label(s["extractor"])}",strategy="{_label(name)}"'
+            lines.append(f"{prefix}_strategy_total{{{labels}}} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def render_streamlit(metrics):
+    """Streamlit に集計のパネルを表示する（画面から呼ぶ）"""
+    import streamlit as st
+
+    s = metrics.summary()
+    with st.expander("処理時間の内訳", expanded=False):
+        if not s["urls"]:
+            st.caption("まだ計測値がありません")
+            return
+        cols = st.columns(3)
+        cols[0].metric("処理したURL", s["urls"])
+        cols[1].metric("1件あたり", f"{s['seconds'] * 1000 / s['urls']:.0f} ms")
+        cols[2].metric("エラー", s["errors"])
+        st.markdown("**工程ごとの時間**")
+        st.table([{"工程": name, "回数": p["count"], "合計（秒）": round(p["seconds"], 3),
+                   "1件あたり（ms）": round(p["ms_per_url"], 2)} for name, p in s["phases"].items()])
+        st.markdown("**住所が取れた方法**")
+        st.table([{"方法": name, "件数": count} for name, count in s["strategies"].items()])
+        st.download_button("JSON で保存", metrics.to_json(records=True), file_name="metrics.json",
+                           mime="application/json")
+        st.download_button("Prometheus 形式で保存", to_prometheus([metrics]), file_name="metrics.prom",
+                           mime="text/plain")
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+抽出結果の表記ゆれをまとめて揃える（DataFrame の列ごとにベクトル化した文字列処理で行う）
+
+例:
+    python normalize.py result.csv -o result_normalized.csv --dedupe
+"""
+
+import argparse
+import sys
+
+import pandas as pd
+
+# 揃えない列
+KEEP_COLUMNS = ("URL", "エラー")
+# NFKC で半角にならないハイフン・ダッシュ類と波ダッシュ（「9:00〜18:00」など）
+DASHES = "‐‑‒–—―−﹣"
+DASH_TABLE = str.maketrans({**{c: "-" for c in DASHES}, "〜": "~"})
+# 数字に挟まれた長音符（「２ー１」など）もハイフンとみなす
+CHOON_RE = r"(?<=\d)ー(?=\d)"
+SPACES_RE = r"\s+"
+NOISE_RE = r"\[.*?\]|GoogleMAP|【.*?】"
+ZIP_RE = r"(\d{3})-?(\d{4})"
+# 「03(1234)5678」のような括弧の区切りをハイフンにする
+PHONE_PAREN_RE = r"(?<=\d)\s*[()]\s*(?=\d)"
+PHONE_RE = r"(\d{2,4}-\d{2,4}-\d{3,4})"
+PHONE_COLUMNS = ("電話番号", "FAX")
+ADDRESS_COLUMN = "所在地"
+ZIP_COLUMN = "郵便番号"
+# 所在地の先頭の郵便番号（重複判定では無視する）
+ADDRESS_ZIP_RE = r"^〒?\s*\d{3}-\d{4}\s*"
+
+
+def normalize_text(series):
+    """全角英数字・記号を半角に、ハイフン類を「-」に、連続する空白を1つにする"""
+    s = series.fillna("").astype(str)
+    s = s.str.normalize("NFKC").str.translate(DASH_TABLE)
+    s = s.str.replace(CHOON_RE, "-", regex=True)
+    s = s.str.replace(SPACES_RE, " ", regex=True)
+    return s.str.strip(" :：")
+
+
+def normalize_zip(series):
+    """郵便番号を「123-4567」に揃える（取り出せなければ空）"""
+    parts = series.str.extract(ZIP_RE)
+    return (parts[0] + "-" + parts[1]).fillna("")
+
+
+def normalize_phone(series):
+    """電話番号・FAX を「03-1234-5678」の形に揃える（形が合わなければそのまま）"""
+    s = series.str.replace(PHONE_PAREN_RE, "-", regex=True)
+    return s.str.extract(PHONE_RE)[0].fillna(s)
+
+
+def normalize_address(series):
+    s = series.str.replace(NOISE_RE, "", regex=True)
+    return s.str.replace(SPACES_RE, " ", regex=True).str.strip()
+
+
+def normalize_frame(df):
+    """結果の DataFrame を列ごとにまとめて揃えた新しい DataFrame を返す"""
+    df = df.copy()
+    for column in df.columns:
+        if column in KEEP_COLUMNS:
+            continue
+        df[column] = normalize_text(df[column])
+    if ADDRESS_COLUMN in df:
+        df[ADDRESS_COLUMN] = normalize_address(df[ADDRESS_COLUMN])
+    if ZIP_COLUMN in df:
+        df[ZIP_COLUMN] = normalize_zip(df[ZIP_COLUMN])
+    for column in PHONE_COLUMNS:
+        if column in df:
+            df[column] = normalize_phone(df[column])
+    return df
+
+
+def address_key(series):
+    """重複判定用の所在地（郵便番号と空白を除いたもの）"""
+    return normalize_text(series).str.replace(ADDRESS_ZIP_RE, "", regex=True).str.replace(SPACES_RE, "", regex=True)
+
+
+def dedupe_by_address(df, column=ADDRESS_COLUMN):
+    """同じ所在地の行は最初の1行だけ残す（所在地が空の行はまとめない）"""
+    if column not in df:
+        return df
+    key = address_key(df[column])
+    return df[~(key.ne("") & key.duplicated())]
+
+
+def read_table(path):
+    if path.endswith((".jsonl", ".ndjson")):
+        return pd.read_json(path, lines=True, dtype=False)
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+
+def write_table(df, path):
+    if path.endswith((".jsonl", ".ndjson")):
+        df.to_json(path, orient="records", lines=True, force_ascii=False)
+    else:
+        df.to_csv(path, index=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="抽出結果（CSV / JSONL）の表記ゆれを揃えます")
+    parser.add_argument("input", help="gmo_cli.py の出力")
+    parser.add_argument("-o", "--output", required=True, help="出力先（拡張子で CSV / JSONL を判断）")
+    parser.add_argument("--dedupe", action="store_true", help="同じ所在地の行は最初の1行だけ残す")
+    args = parser.parse_args(argv)
+
+    df = normalize_frame(read_table(args.input))
+    if args.dedupe:
+        df = dedupe_by_address(df)
+    write_table(df, args.output)
+    print(f"{len(df)}行を書き出しました: {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+解析用のプロセスプール（HTMLの解析と住所の照合を別プロセスで行い、GILに縛られずに複数コアを使う）
+
+取得はこれまでどおり取得エンジンのスレッドで行い、ダウンロードした本文（bytes）だけを
+解析用のプロセスに渡す。プロセス側では抽出器のスクリプトを読み込み直して同じ関数を実行し、
+結果と計測値（工程ごとの時間・住所が取れた方法）を親に返す。
+
+    result = parse_pool.run(analyze_page, url, content, METRICS)
+
+プロセス数が0（既定）のときは呼び出したスレッドでそのまま実行する。
+"""
+
+import atexit
+import importlib.util
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# 解析用のプロセス数（0ならプロセスを使わない）
+WORKERS = int(os.environ.get("GMO_PARSE_WORKERS", "0"))
+# 解析待ち（空きプロセスを待つ時間と受け渡しの時間）の工程名
+WAIT_PHASE = "parse_wait"
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# 解析用のプロセスで読み込んだ抽出器のスクリプト（パス → モジュール）
+_scripts = {}
+
+
+def configure(workers):
+    """プロセス数を変える（動いているプールは閉じ、次に使うときに作り直す）"""
+    global WORKERS
+    shutdown()
+    WORKERS = max(0, int(workers))
+
+
+def get_pool():
+    """プールを返す（なければ作る。プロセス数が0なら None）"""
+    global _pool
+    with _pool_lock:
+        if _pool is None and WORKERS > 0:
+            # 取得スレッドが動いているプロセスを fork すると危ないので spawn で起動する
+            _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
+
+
+atexit.register(shutdown)
+
+
+def _load_script(path):
+    # 画面の main() は __name__ が "__main__" のときだけ動くので、別名で読み込めば表示されない
+    module = _scripts.get(path)
+    if module is None:
+        spec = importlib.util.spec_from_file_location(f"_parse_worker_{len(_scripts)}", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _scripts[path] = module
+    return module
+
+
+def _run_in_worker(path, func_name, metrics_name, url, content):
+    # 解析用のプロセスで実行される
+    from metrics import get_metrics
+
+    func = getattr(_load_script(path), func_name)
+    with get_metrics(metrics_name).track(url) as record:
+        result = func(url, content)
+    return result, record
+
+
+def run(func, url, content, metrics):
+    """func(url, content) を解析用のプロセスで実行して結果を返す（プロセス数が0ならこのスレッドで）
+
+    func は抽出器のスクリプトに定義された関数であること（プロセス側でスクリプトを読み込んで名前で探す）。
+    プロセス側の計測値は metrics のいま処理中のURLの記録に足す。
+    """
+    pool = get_pool()
+    if pool is None:
+        return func(url, content)
+    path = func.__globals__["__file__"]
+    with metrics.phase(WAIT_PHASE):
+        future = pool.submit(_run_in_worker, path, func.__name__, metrics.name, url, content)
+        result, record = future.result()
+        metrics.merge(record)
+    return result
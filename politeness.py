@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ホストごとのアクセス間隔の制御（トークンバケット・robots.txt の Crawl-delay・適応的な減速）
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+import http_session
+
+# 1ホストあたりの既定のリクエスト数/秒と、連続して送ってよい数
+DEFAULT_RATE = 2.0
+BURST = 2
+# 減速したときの下限と、成功ごとに戻す量
+MIN_RATE = 0.05
+RATE_STEP = 0.1
+# 429/503 のあとに待つ秒数（続くたびに倍、上限あり）
+BASE_BACKOFF = 2.0
+MAX_BACKOFF = 300.0
+# 応答がこれより遅いホストは減速する（秒、指数移動平均）
+SLOW_LATENCY = 5.0
+LATENCY_ALPHA = 0.3
+ROBOTS_TIMEOUT = 5
+
+# 取得エンジンのタスクを実行中のスレッドが使っているスケジューラー
+_current = threading.local()
+
+
+class HostState:
+    """1ホスト分の状態"""
+
+    def __init__(self, rate=DEFAULT_RATE, burst=BURST):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.backoff = BASE_BACKOFF
+        self.latency = None
+        self.robots_checked = False
+        self.crawl_delay = None
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def ready_at(self, now):
+        """次にリクエストを送ってよい時刻（monotonic）"""
+        self._refill(now)
+        at = now if self.tokens >= 1 else now + (1 - self.tokens) / self.rate
+        return max(at, self.blocked_until)
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def set_crawl_delay(self, delay):
+        self.crawl_delay = delay
+        self.max_rate = min(self.max_rate, 1.0 / delay)
+        self.rate = min(self.rate, self.max_rate)
+        self.burst = 1
+        self.tokens = min(self.tokens, 1)
+
+
+class PolitenessScheduler:
+    """ホストごとに送信間隔を管理し、制限を受けたホストだけを遅らせる"""
+
+    def __init__(self, rate=DEFAULT_RATE, burst=BURST, use_robots=True):
+        self.rate = rate
+        self.burst = burst
+        self.use_robots = use_robots
+        self._hosts = {}
+        self._lock = threading.Lock()
+        self._robots_locks = {}
+
+    def _state(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = HostState(self.rate, self.burst)
+        return state
+
+    def ready_at(self, host):
+        with self._lock:
+            return self._state(host).ready_at(time.monotonic())
+
+    def acquire(self, host):
+        """送信する分のトークンを使う"""
+        with self._lock:
+            self._state(host).take(time.monotonic())
+
+    def wait_turn(self, url):
+        """そのホストに送ってよくなるまで待ってからトークンを使う（エンジンを通さない追加の取得用）"""
+        self.check_robots(url)
+        host = urlsplit(url).hostname or url
+        while True:
+            with self._lock:
+                state = self._state(host)
+                now = time.monotonic()
+                at = state.ready_at(now)
+                if at <= now:
+                    state.take(now)
+                    return
+            time.sleep(at - now)
+
+    def observe(self, url, status, latency):
+        """実際の応答の結果で速度を調整する（http_session の observer として登録する）"""
+        host = urlsplit(url).hostname or url
+        with self._lock:
+            state = self._state(host)
+            if state.latency is None:
+                state.latency = latency
+            else:
+                state.latency = LATENCY_ALPHA * latency + (1 - LATENCY_ALPHA) * state.latency
+            if status in http_session.RETRY_STATUS:
+                return
+            state.backoff = BASE_BACKOFF
+            if state.latency > SLOW_LATENCY:
+                state.rate = max(MIN_RATE, state.rate * 0.8)
+            else:
+                state.rate = min(state.max_rate, state.rate + RATE_STEP)
+
+    def throttled(self, host, retry_after=None):
+        """429/503 を受けたホストを待たせ、速度を半分に落とす"""
+        with self._lock:
+            state = self._state(host)
+            wait = max(retry_after or 0.0, state.backoff)
+            state.blocked_until = max(state.blocked_until, time.monotonic() + wait)
+            state.backoff = min(MAX_BACKOFF, state.backoff * 2)
+            state.rate = max(MIN_RATE, state.rate / 2)
+            state.tokens = min(state.tokens, 0)
+
+    def check_robots(self, url):
+        """ホストの robots.txt を一度だけ読み、Crawl-delay / Request-rate を反映する"""
+        if not self.use_robots:
+            return
+        parts = urlsplit(url)
+        host = parts.hostname or url
+        with self._lock:
+            state = self._state(host)
+            if state.robots_checked:
+                return
+            lock = self._robots_locks.setdefault(host, threading.Lock())
+        with lock:
+            if state.robots_checked:
+                return
+            delay = None
+            try:
+                res = http_session.fetch(f"{parts.scheme}://{parts.netloc}/robots.txt", timeout=ROBOTS_TIMEOUT)
+                if res.status_code == 200:
+                    parser = RobotFileParser()
+                    parser.parse(res.content.decode("utf-8", "replace").splitlines())
+                    agent = http_session.DEFAULT_HEADERS["User-Agent"]
+                    delay = parser.crawl_delay(agent)
+                    rate = parser.request_rate(agent)
+                    if rate and rate.requests:
+                        delay = max(delay or 0, rate.seconds / rate.requests)
+            except Exception:
+                delay = None
+            with self._lock:
+                if delay:
+                    state.set_crawl_delay(float(delay))
+                state.robots_checked = True
+
+
+@contextmanager
+def using(scheduler):
+    """このスレッドで実行する処理の追加の取得にも scheduler の送信間隔を使わせる"""
+    previous = getattr(_current, "scheduler", None)
+    _current.scheduler = scheduler
+    try:
+        yield scheduler
+    finally:
+        _current.scheduler = previous
+
+
+def wait_turn(url):
+    """取得エンジンのタスクの中なら、そのスケジューラーでホストの順番を待つ（外なら何もしない）"""
+    scheduler = getattr(_current, "scheduler", None)
+    if scheduler is not None:
+        scheduler.wait_turn(url)
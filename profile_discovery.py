@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+トップページなどから会社概要ページらしいリンクを探してたどる
+"""
+
+from urllib.parse import unquote, urldefrag, urljoin, urlsplit
+
+from http_session import ThrottledError
+from politeness import wait_turn
+
+# リンクの文字列やURLに含まれていれば会社概要ページらしいと見なす語と、その点数
+PROFILE_LINK_HINTS = {
+    "会社概要": 10, "企業概要": 10, "会社案内": 8, "会社情報": 8, "企業情報": 8,
+    "company": 6, "profile": 6, "corporate": 5, "about": 5, "outline": 4, "overview": 3,
+    "アクセス": 4, "access": 4, "所在地": 6, "本社": 3,
+}
+# 抽出器から渡される住所のキーワード（ADDRESS_KEYWORDS）1つあたりの点数
+EXTRA_HINT_SCORE = 2
+# 住所がまず載っていないページ
+NEGATIVE_HINTS = ("recruit", "採用", "news", "blog", "privacy", "プライバシー", "sitemap", "login")
+SKIP_EXTENSIONS = (".pdf", ".jpg", ".jpeg", ".png", ".gif", ".zip", ".doc", ".docx", ".xls", ".xlsx")
+# これより低い点数のリンクはたどらない
+MIN_SCORE = 4
+# 1つのURLにつき、たどる候補ページの数の上限
+MAX_PROFILE_PAGES = 3
+
+
+def _site(host):
+    host = (host or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def score_link(href, label, extra_keywords=()):
+    """リンクの文字列とURLのパスから、会社概要ページらしさの点数を付ける"""
+    label = label.lower()
+    path = unquote(urlsplit(href).path).lower()
+    if any(h in label or h in path for h in NEGATIVE_HINTS):
+        return 0
+    score = 0
+    for hint, point in PROFILE_LINK_HINTS.items():
+        if hint in label:
+            score += point
+        if hint in path:
+            score += point
+    for keyword in extra_keywords:
+        keyword = keyword.lower()
+        if keyword not in PROFILE_LINK_HINTS and (keyword in label or keyword in path):
+            score += EXTRA_HINT_SCORE
+    return score
+
+
+def profile_links(links, base_url, extra_keywords=(), limit=MAX_PROFILE_PAGES):
+    """(href, 文字列) のリストから、同じサイト内の会社概要ページらしいURLを点数の高い順に返す"""
+    base = urlsplit(base_url)
+    page = urldefrag(base_url)[0]
+    scores = {}
+    for order, (href, label) in enumerate(links):
+        if href.startswith(("#", "mailto:", "tel:", "javascript:")):
+            continue
+        url = urldefrag(urljoin(base_url, href))[0]
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or _site(parts.hostname) != _site(base.hostname):
+            continue
+        if url == page or parts.path.lower().endswith(SKIP_EXTENSIONS):
+            continue
+        score = score_link(url, label, extra_keywords)
+        if score < MIN_SCORE:
+            continue
+        # 同じURLへのリンクが複数あれば高いほうの点数を使い、同点ならページ内で先に出たものを優先する
+        best = scores.get(url)
+        if best is None or score > best[0]:
+            scores[url] = (score, best[1] if best else order)
+    ranked = sorted(scores, key=lambda u: (-scores[u][0], scores[u][1]))
+    return tuple(ranked[:limit])
+
+
+def follow_profile_links(candidates, extract, field="所在地"):
+    """候補ページを順に extract(url) で抽出し、field が取れた最初の結果を返す（なければ None）
+
+    extract は (結果の辞書, そのページの候補) を返す関数。候補先のリンクはたどらない。
+    取得できなかった候補は飛ばす（アクセス制限だけは呼び出し元に伝える）。
+    取得エンジンの中で呼ばれたときは、候補ごとにホストの送信間隔（Crawl-delay を含む）を待つ。
+    """
+    for url in candidates:
+        wait_turn(url)
+        try:
+            info, _ = extract(url)
+        except ThrottledError:
+            raise
+        except Exception:
+            continue
+        if info.get(field):
+            return info
+    return None
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTTPレスポンスのディスクキャッシュ（SQLite・zlib圧縮）
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+CACHE_PATH = os.environ.get("GMO_HTTP_CACHE", os.path.join(".gmo_cache", "http_cache.sqlite3"))
+# この秒数以内なら再取得せずにキャッシュを返す
+TTL = 24 * 3600
+# この秒数を過ぎたエントリは再検証にも使わず削除する
+MAX_AGE = 30 * 24 * 3600
+# 圧縮後の合計サイズの上限（超えたら最終アクセスの古いものから削除）
+MAX_BYTES = 512 * 1024 * 1024
+
+# 再生時に復元するヘッダー
+KEEP_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    url TEXT PRIMARY KEY,
+    status INTEGER NOT NULL,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    fetched_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    partial INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at);
+"""
+
+
+class ResponseCache:
+    """URLをキーにレスポンス本文を保存するキャッシュ"""
+
+    def __init__(self, path=CACHE_PATH, ttl=TTL, max_age=MAX_AGE, max_bytes=MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(responses)")]
+        if "partial" not in columns:
+            self._conn.execute("ALTER TABLE responses ADD COLUMN partial INTEGER NOT NULL DEFAULT 0")
+        self.prune()
+        self._total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, url):
+        """保存済みのエントリを返す（なければ None）"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, headers, body, etag, last_modified, fetched_at, partial FROM responses WHERE url = ?",
+                (url,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (time.time(), url))
+            self._conn.commit()
+        status, headers, body, etag, last_modified, fetched_at, partial = row
+        return {
+            "status": status,
+            "headers": json.loads(headers),
+            "content": zlib.decompress(body),
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": fetched_at,
+            "partial": bool(partial),
+        }
+
+    def is_fresh(self, entry):
+        return time.time() - entry["fetched_at"] < self.ttl
+
+    def put(self, url, res, partial=False):
+        """取得したレスポンスを保存する（partial は途中で読むのをやめた本文）"""
+        headers = {k: res.headers[k] for k in KEEP_HEADERS if k in res.headers}
+        body = zlib.compress(res.content)
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE url = ?", (url,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, res.status_code, json.dumps(headers), body, len(body),
+                 res.headers.get("ETag"), res.headers.get("Last-Modified"), now, now, int(partial)),
+            )
+            self._total += len(body) - (old[0] if old else 0)
+            if self._total > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def touch(self, url):
+        """304 で再検証できたエントリの取得時刻を更新する"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("UPDATE responses SET fetched_at = ?, accessed_at = ? WHERE url = ?",
+                               (now, now, url))
+            self._conn.commit()
+
+    def prune(self):
+        """期限切れのエントリを削除する"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE fetched_at < ?", (time.time() - self.max_age,))
+            self._conn.commit()
+
+    def _evict(self):
+        # 上限の9割まで、最終アクセスの古いものから削除
+        target = self.max_bytes * 0.9
+        rows = self._conn.execute("SELECT url, size FROM responses ORDER BY accessed_at").fetchall()
+        for url, size in rows:
+            if self._total <= target:
+                break
+            self._conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+            self._total -= size
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._total = 0
+
+
+def to_response(url, entry):
+    """キャッシュのエントリを requests.Response に戻す"""
+    res = requests.Response()
+    res.url = url
+    res.status_code = entry["status"]
+    res.headers = CaseInsensitiveDict(entry["headers"])
+    res._content = entry["content"]
+    res.from_cache = True
+    res.partial = entry["partial"]
+    return res
+
+
+def cached_get(cache, url, send, allow_partial=False):
+    """キャッシュを使って取得する（期限切れなら ETag/Last-Modified で再検証）
+
+    send(headers) は追加ヘッダーを付けて実際に取得する関数。
+    allow_partial が False なら、途中までしか読んでいない本文のエントリは使わない。
+    """
+    entry = cache.get(url)
+    if entry is not None and entry["partial"] and not allow_partial:
+        entry = None
+    if entry is not None and cache.is_fresh(entry):
+        return to_response(url, entry)
+
+    headers = {}
+    if entry is not None:
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    res = send(headers)
+    if res.status_code == 304 and entry is not None:
+        cache.touch(url)
+        return to_response(url, entry)
+    if res.status_code == 200:
+        cache.put(url, res, partial=getattr(res, "partial", False))
+    res.from_cache = False
+    return res
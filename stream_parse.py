@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ダウンロードしながら会社概要の行を読み、住所が取れたら打ち切るパーサー
+"""
+
+import codecs
+import re
+from html.parser import HTMLParser
+
+# <dt>所在地</dt><dd>...</dd> と <th>本社</th><td>...</td> の見出し
+DT_KEYS = ("所在地",)
+TH_KEYS = ("本社", "本店", "本店所在地", "本社所在地")
+
+_META_CHARSET_RE = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?([\w.:-]+)""", re.IGNORECASE)
+# 文字コードを決めるまでに待つ先頭のバイト数
+_SNIFF_BYTES = 4096
+
+
+def sniff_encoding(head):
+    """BOM か <meta charset> から文字コードを推定する（不明なら utf-8）"""
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    m = _META_CHARSET_RE.search(head)
+    if m:
+        name = m.group(1).decode("ascii", "ignore")
+        try:
+            return codecs.lookup(name).name
+        except LookupError:
+            pass
+    return "utf-8"
+
+
+class ProfileRowScanner(HTMLParser):
+    """dt/dd・th/td の行を文書順に読み、住所パターンに合う値が見つかった時点で止まる
+
+    feed_bytes をダウンロードの断片ごとに呼び、真が返ったらそれ以上読まなくてよい。
+    見つかった住所は address に入る（見つからなければ空文字）。
+    clean は th/td の値を照合する前に適用する関数。
+    """
+
+    def __init__(self, matcher, clean=None, dt_keys=DT_KEYS, th_keys=TH_KEYS):
+        super().__init__(convert_charrefs=True)
+        self.matcher = matcher
+        self.clean = clean
+        self.dt_keys = dt_keys
+        self.th_keys = th_keys
+        self.address = ""
+        self.source = ""
+        self._head = b""
+        self._decoder = None
+        self._skip = 0
+        self._text = []
+        self._capture = None
+        self._pieces = []
+        self._dt_matched = False
+        self._row = None
+
+    def feed_bytes(self, chunk):
+        if self.address:
+            return True
+        if self._decoder is None:
+            self._head += chunk
+            if len(self._head) < _SNIFF_BYTES:
+                return False
+            chunk, self._head = self._head, b""
+            self._decoder = codecs.getincrementaldecoder(sniff_encoding(chunk))(errors="replace")
+        self.feed(self._decoder.decode(chunk))
+        return bool(self.address)
+
+    def close(self):
+        if self._decoder is None and self._head:
+            self._decoder = codecs.getincrementaldecoder(sniff_encoding(self._head))(errors="replace")
+            self.feed(self._decoder.decode(self._head))
+            self._head = b""
+        super().close()
+        self._flush_text()
+        self._end_capture()
+        self._end_row()
+
+    # --- テキストの収集 ---
+
+    def handle_data(self, data):
+        if not self._skip and self._capture is not None:
+            self._text.append(data)
+
+    def _flush_text(self):
+        # 断片に分かれて届いた1つのテキストノードを、タグの境目でまとめて1つにする
+        if self._text:
+            piece = "".join(self._text).strip()
+            self._text = []
+            if piece:
+                self._pieces.append(piece)
+
+    def _start_capture(self, kind):
+        self._end_capture()
+        self._capture = kind
+        self._pieces = []
+
+    def _end_capture(self):
+        self._flush_text()
+        kind, pieces = self._capture, self._pieces
+        self._capture = None
+        self._pieces = []
+        if kind == "dt":
+            self._dt_matched = any(k in "".join(pieces) for k in self.dt_keys)
+        elif kind == "dd":
+            if self._dt_matched:
+                self._dt_matched = False
+                self._try(" ".join(pieces), "dt/dd")
+        elif kind in ("th", "td") and self._row is not None and kind not in self._row:
+            self._row[kind] = pieces
+
+    def _end_row(self):
+        row, self._row = self._row, None
+        if not row or "th" not in row or "td" not in row:
+            return
+        key = "".join(row["th"])
+        if any(k in key for k in self.th_keys):
+            self._try(" ".join(row["td"]), "th/td")
+
+    def _try(self, val, source):
+        if self.address:
+            return
+        if source == "th/td" and self.clean is not None:
+            val = self.clean(val)
+        m = self.matcher.search(val)
+        if m:
+            self.address = m.group().strip()
+            self.source = source
+
+    # --- タグ ---
+
+    def handle_starttag(self, tag, attrs):
+        self._flush_text()
+        if tag in ("script", "style"):
+            self._skip += 1
+        elif tag in ("dt", "dd"):
+            self._start_capture(tag)
+        elif tag == "tr":
+            self._end_capture()
+            self._end_row()
+            self._row = {}
+        elif tag in ("th", "td") and self._row is not None:
+            self._start_capture(tag)
+
+    def handle_endtag(self, tag):
+        self._flush_text()
+        if tag in ("script", "style"):
+            self._skip = max(0, self._skip - 1)
+        elif tag in ("dt", "dd", "th", "td") and self._capture == tag:
+            self._end_capture()
+        elif tag == "dl":
+            self._end_capture()
+            self._dt_matched = False
+        elif tag in ("tr", "table"):
+            self._end_capture()
+            self._end_row()
+
+    def handle_comment(self, data):
+        self._flush_text()
+